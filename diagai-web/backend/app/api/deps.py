@@ -1,13 +1,16 @@
-from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status
+from typing import Any, Generator, Optional
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from firebase_admin import auth as firebase_auth
 from app.core.database import db
+from app.core.dataloader import Loaders, request_loaders
 from app.core.config import get_settings
 from app.core.security import verify_token
+from app.core.user_cache import get_user
 
 settings = get_settings()
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 async def get_db():
     """Get database instance."""
@@ -20,10 +23,17 @@ async def get_db():
             detail=f"Database connection error: {str(e)}"
         )
 
-async def get_current_user_id(
+async def get_loaders(
+    request: Request,
+    db = Depends(get_db)
+) -> Loaders:
+    """Get the request-scoped batching loaders."""
+    return request_loaders(request, db)
+
+async def get_token_payload(
     credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> str:
-    """Get current user ID from JWT token."""
+) -> dict:
+    """Get the verified claims of the bearer JWT."""
     try:
         token = credentials.credentials
         payload = await verify_token(token)
@@ -32,20 +42,33 @@ async def get_current_user_id(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials"
             )
-        return payload["sub"]
+        return payload
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Could not validate credentials: {str(e)}"
         )
 
+async def get_current_user_id(
+    payload: dict = Depends(get_token_payload)
+) -> str:
+    """Get current user ID from JWT token."""
+    return payload["sub"]
+
 async def get_current_active_user(
+    request: Request,
     user_id: str = Depends(get_current_user_id),
     db = Depends(get_db)
 ) -> dict:
-    """Get current active user."""
+    """Get current active user.
+
+    The user may come from this worker's user cache, so a change made on
+    another worker (credits, plan, `disabled`) can take up to
+    USER_INVALIDATION_POLL_INTERVAL seconds to show here. Credit deductions
+    re-check the balance in the update itself and never trust this copy.
+    """
     try:
-        user = await db.users.find_one({"_id": user_id})
+        user = await get_user(db, user_id, request)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -66,12 +89,35 @@ async def get_current_active_user(
         )
 
 async def get_current_admin_user(
-    current_user: dict = Depends(get_current_active_user)
+    request: Request,
+    payload: dict = Depends(get_token_payload),
+    db = Depends(get_db)
 ) -> dict:
-    """Get current admin user."""
+    """Get current admin user.
+
+    Tokens from /admin/login carry `is_admin` and the static admin email as
+    `sub`, which is not a user id; other tokens must belong to a user with
+    `is_admin` set.
+    """
+    if payload.get("is_admin"):
+        return {"_id": payload["sub"], "email": payload["sub"], "name": "Admin", "is_admin": True}
+    current_user = await get_current_active_user(request, payload["sub"], db)
     if not current_user.get("is_admin", False):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User does not have admin privileges"
         )
     return current_user
+
+async def require_admin(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials],
+    db
+) -> dict:
+    """Check admin credentials where only some requests to an endpoint need them."""
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+    return await get_current_admin_user(request, await get_token_payload(credentials), db)
@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.api.deps import get_db, get_current_admin_user
-from datetime import datetime, timedelta
+from app.api.deps import get_db, get_current_admin_user, get_loaders, optional_security, require_admin
+from app.core.user_cache import invalidate_user
+from app.core.dataloader import Loaders
+from app.core.etag import conditional
+from app.core.pagination import cached_count, keyset_page, validate_sort
+from app.core.projections import resolve_projection
+from app.core.responses import ORJSONRoute
+from datetime import datetime
 from typing import Optional, List
 from bson import ObjectId
 from fastapi.responses import JSONResponse
+from fastapi.security import HTTPAuthorizationCredentials
 from app.core.security import create_access_token
+from app.services import counters, usage
+from app.services.admin_stats import admin_stats
 from app.core.config import get_settings
 from pydantic import BaseModel
 import math
@@ -14,12 +23,35 @@ import logging
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
 class AdminLoginRequest(BaseModel):
     email: str
     password: str
 
+# Fields of the user shown next to each admin row
+USER_SUMMARY_FIELDS = ("email", "name")
+
+async def _users_by_id(loaders: Loaders, user_ids: list) -> dict:
+    """Fetch users for a page of rows in one batched load, keyed by string id.
+
+    User ids are stored both as strings and as ObjectIds, so match either form.
+    """
+    ids = {str(user_id) for user_id in user_ids if user_id}
+    lookup_ids = list(ids) + [ObjectId(user_id) for user_id in ids if ObjectId.is_valid(user_id)]
+    users = await loaders.projected("users", USER_SUMMARY_FIELDS).load_many(lookup_ids)
+    return {str(user["_id"]): user for user in users if user}
+
+async def _count_by(db: AsyncIOMotorDatabase, collection: str, field: str, values: list) -> dict:
+    """Count documents per value of `field` for a page of rows in one aggregation."""
+    if not values:
+        return {}
+    counts = await db[collection].aggregate([
+        {"$match": {field: {"$in": values}}},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+    ]).to_list(length=None)
+    return {item["_id"]: item["count"] for item in counts}
+
 # Static admin credentials (in production, use environment variables and proper hashing)
 ADMIN_EMAIL = "admin@example.com"
 ADMIN_PASSWORD = "admin123"
@@ -30,11 +62,15 @@ async def get_users(
     limit: int = Query(10, ge=1, le=100),
     search: str = Query(""),
     sort_by: str = Query("created_at"),
-    sort_order: str = Query("desc"),
+    sort_order: str = Query("desc", enum=["asc", "desc"]),
+    cursor: Optional[str] = Query(None),
+    include_total: bool = Query(True),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get paginated list of users"""
     try:
+        sort_by = validate_sort("users", sort_by)
+
         # Build query
         query = {}
         if search:
@@ -44,17 +80,17 @@ async def get_users(
             ]
 
         # Get total count
-        total = await db.users.count_documents(query)
-
-        # Sort direction
-        sort_direction = -1 if sort_order.lower() == "desc" else 1
+        total = await cached_count(db.users, query) if include_total else None
 
         # Get users with pagination
-        users = await db.users.find(query) \
-            .sort(sort_by, sort_direction) \
-            .skip((page - 1) * limit) \
-            .limit(limit) \
-            .to_list(length=None)
+        users, next_cursor = await keyset_page(
+            db.users, query, sort_by, sort_order, limit, cursor=cursor, page=page
+        )
+
+        # Count diagrams for the whole page at once
+        diagram_counts = await _count_by(
+            db, "diagrams", "user_id", [str(user["_id"]) for user in users]
+        )
 
         # Process users for response
         user_list = []
@@ -68,7 +104,7 @@ async def get_users(
                 "created_at": user.get("created_at", ""),
                 "last_login": user.get("last_login", ""),
                 "status": user.get("status", "active"),
-                "total_diagrams": await db.diagrams.count_documents({"user_id": str(user["_id"])})
+                "total_diagrams": diagram_counts.get(str(user["_id"]), 0)
             })
 
         return {
@@ -76,9 +112,12 @@ async def get_users(
             "total": total,
             "page": page,
             "limit": limit,
-            "pages": math.ceil(total / limit) if total > 0 else 1
+            "pages": (math.ceil(total / limit) if total > 0 else 1) if total is not None else None,
+            "next_cursor": next_cursor
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting users: {str(e)}")
         raise HTTPException(
@@ -88,115 +127,18 @@ async def get_users(
 
 @router.get("/stats")
 async def get_admin_stats(
+    request: Request,
+    response: Response,
+    refresh: bool = False,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Get admin dashboard statistics"""
+    """Get admin dashboard statistics from the latest snapshot; refresh=true (admin only) recomputes it"""
+    if refresh:
+        await require_admin(request, credentials, db)
     try:
-        logger.info("Fetching admin dashboard statistics...")
-        
-        # Get total users
-        total_users = await db.users.count_documents({})
-        logger.info(f"Total users: {total_users}")
-        
-        # Get users registered in last 30 days
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        new_users_query = {
-            "$or": [
-                {"created_at": {"$gte": thirty_days_ago}},
-                {"createdAt": {"$gte": thirty_days_ago}}  # Handle both field names
-            ]
-        }
-        new_users = await db.users.count_documents(new_users_query)
-        logger.info(f"New users in last 30 days: {new_users}")
-        
-        # Get total diagrams
-        total_diagrams = await db.diagrams.count_documents({})
-        logger.info(f"Total diagrams: {total_diagrams}")
-        
-        # Get diagrams created in last 30 days
-        new_diagrams_query = {
-            "$or": [
-                {"created_at": {"$gte": thirty_days_ago}},
-                {"createdAt": {"$gte": thirty_days_ago}}  # Handle both field names
-            ]
-        }
-        new_diagrams = await db.diagrams.count_documents(new_diagrams_query)
-        logger.info(f"New diagrams in last 30 days: {new_diagrams}")
-        
-        # Get total credits used
-        credits_pipeline = [
-            {
-                "$group": {
-                    "_id": None,
-                    "total_credits": {
-                        "$sum": {
-                            "$cond": [
-                                {"$ifNull": ["$credits", False]},
-                                "$credits",
-                                0
-                            ]
-                        }
-                    }
-                }
-            }
-        ]
-        credits_result = await db.users.aggregate(credits_pipeline).to_list(length=1)
-        total_credits = credits_result[0]["total_credits"] if credits_result else 0
-        logger.info(f"Total credits used: {total_credits}")
-        
-        # Get active users (users who created diagrams in last 30 days)
-        active_users_query = {
-            "$or": [
-                {"created_at": {"$gte": thirty_days_ago}},
-                {"createdAt": {"$gte": thirty_days_ago}}
-            ]
-        }
-        active_users = await db.diagrams.distinct("user_id", active_users_query)
-        active_users_count = len(active_users) if active_users else 0
-        logger.info(f"Active users in last 30 days: {active_users_count}")
-        
-        # Get diagrams by status
-        status_pipeline = [
-            {
-                "$group": {
-                    "_id": {
-                        "$ifNull": ["$status", "pending"]  # Default status if not set
-                    },
-                    "count": {"$sum": 1}
-                }
-            }
-        ]
-        status_counts = await db.diagrams.aggregate(status_pipeline).to_list(length=None)
-        diagrams_by_status = {
-            item["_id"]: item["count"] 
-            for item in status_counts
-        }
-        logger.info(f"Diagrams by status: {diagrams_by_status}")
-        
-        # Add some sample data if no data exists (for testing)
-        if total_users == 0 and total_diagrams == 0:
-            logger.warning("No data found in database, adding sample data...")
-            await add_sample_data(db)
-            return await get_admin_stats(db)
-        
-        stats = {
-            "users": {
-                "total": total_users,
-                "new": new_users,
-                "active": active_users_count
-            },
-            "diagrams": {
-                "total": total_diagrams,
-                "new": new_diagrams,
-                "by_status": diagrams_by_status or {"pending": 0, "completed": 0}
-            },
-            "credits": {
-                "total": total_credits
-            }
-        }
-        
-        logger.info(f"Returning stats: {stats}")
-        return stats
+        snapshot = await (admin_stats.refresh(db) if refresh else admin_stats.get(db))
+        return conditional(request, response, snapshot["computed_at"]) or snapshot
         
     except Exception as e:
         logger.error(f"Error getting admin stats: {str(e)}")
@@ -205,55 +147,6 @@ async def get_admin_stats(
             detail=f"Error getting admin statistics: {str(e)}"
         )
 
-async def add_sample_data(db: AsyncIOMotorDatabase):
-    """Add sample data for testing"""
-    try:
-        # Add sample users
-        sample_users = [
-            {
-                "_id": ObjectId(),
-                "email": "user1@example.com",
-                "name": "User 1",
-                "credits": 100,
-                "created_at": datetime.utcnow() - timedelta(days=40),
-                "is_admin": False
-            },
-            {
-                "_id": ObjectId(),
-                "email": "user2@example.com",
-                "name": "User 2",
-                "credits": 50,
-                "created_at": datetime.utcnow() - timedelta(days=15),
-                "is_admin": False
-            }
-        ]
-        await db.users.insert_many(sample_users)
-        
-        # Add sample diagrams
-        sample_diagrams = [
-            {
-                "user_id": str(sample_users[0]["_id"]),
-                "status": "completed",
-                "created_at": datetime.utcnow() - timedelta(days=35)
-            },
-            {
-                "user_id": str(sample_users[0]["_id"]),
-                "status": "pending",
-                "created_at": datetime.utcnow() - timedelta(days=10)
-            },
-            {
-                "user_id": str(sample_users[1]["_id"]),
-                "status": "completed",
-                "created_at": datetime.utcnow() - timedelta(days=5)
-            }
-        ]
-        await db.diagrams.insert_many(sample_diagrams)
-        
-        logger.info("Added sample data successfully")
-    except Exception as e:
-        logger.error(f"Error adding sample data: {str(e)}")
-        raise
-
 @router.get("/diagrams", response_model=dict)
 async def get_diagrams(
     page: int = Query(1, ge=1),
@@ -263,11 +156,15 @@ async def get_diagrams(
     type: Optional[str] = Query(None, enum=["image", "gif"]),
     sort_by: Optional[str] = Query(None, enum=["created_at", "status", "type"]),
     sort_order: Optional[str] = Query("desc", enum=["asc", "desc"]),
+    cursor: Optional[str] = Query(None),
+    include_total: bool = Query(True),
+    view: str = Query("full", enum=["summary", "full"]),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return; overrides view"),
     current_admin: dict = Depends(get_current_admin_user),
-    db: AsyncIOMotorDatabase = Depends(get_db)
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    loaders: Loaders = Depends(get_loaders)
 ):
     """Get paginated list of diagrams with filters"""
-    skip = (page - 1) * limit
     query = {}
     
     if search:
@@ -278,22 +175,19 @@ async def get_diagrams(
         query["type"] = type
     
     # Get total count for pagination
-    total_count = await db.diagrams.count_documents(query)
-    
-    # Prepare sort query
-    sort_field = sort_by if sort_by else "created_at"
-    sort_direction = -1 if sort_order == "desc" else 1
+    total_count = await cached_count(db.diagrams, query) if include_total else None
     
     # Get diagrams with pagination
-    diagrams = await db.diagrams.find(query) \
-        .sort(sort_field, sort_direction) \
-        .skip(skip) \
-        .limit(limit) \
-        .to_list(None)
+    sort_field = validate_sort("diagrams", sort_by)
+    diagrams, next_cursor = await keyset_page(
+        db.diagrams, query, sort_field, sort_order, limit, cursor=cursor, page=page,
+        projection=resolve_projection("diagrams", view, fields, required=("user_id",))
+    )
     
-    # Get user details for each diagram
+    # Get user details for the whole page at once
+    users = await _users_by_id(loaders, [diagram.get("user_id") for diagram in diagrams])
     for diagram in diagrams:
-        user = await db.users.find_one({"_id": diagram["user_id"]})
+        user = users.get(str(diagram.get("user_id")))
         diagram["user"] = {
             "email": user["email"],
             "name": user.get("name", "")
@@ -304,7 +198,8 @@ async def get_diagrams(
         "total": total_count,
         "page": page,
         "limit": limit,
-        "total_pages": (total_count + limit - 1) // limit
+        "total_pages": (total_count + limit - 1) // limit if total_count is not None else None,
+        "next_cursor": next_cursor
     }
 
 @router.post("/users/{user_id}/credits", response_model=dict)
@@ -323,6 +218,7 @@ async def update_user_credits(
         {"_id": user_id},
         {"$inc": {"credits": credits}}
     )
+    await invalidate_user(db, user_id)
     
     return {"message": "Credits updated successfully"}
 
@@ -342,9 +238,11 @@ async def delete_user(
     
     # Delete user's projects
     await db.projects.delete_many({"user_id": user_id})
+    await db.usage_daily.delete_many({"user_id": user_id})
     
     # Delete user
     await db.users.delete_one({"_id": user_id})
+    await invalidate_user(db, user_id)
     
     return {"message": "User and associated data deleted successfully"}
 
@@ -355,12 +253,15 @@ async def delete_diagram(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Delete a diagram"""
-    diagram = await db.diagrams.find_one({"_id": diagram_id})
+    # Delete the diagram
+    diagram = await db.diagrams.find_one_and_delete(
+        {"_id": diagram_id},
+        projection={"user_id": 1, "status": 1, "type": 1, "created_at": 1}
+    )
     if not diagram:
         raise HTTPException(status_code=404, detail="Diagram not found")
-    
-    # Delete the diagram
-    await db.diagrams.delete_one({"_id": diagram_id})
+    await counters.apply_counters(db, diagram["user_id"], counters.diagram_deleted(diagram))
+    await usage.record_deleted(db, diagram)
     
     return {"message": "Diagram deleted successfully"}
 
@@ -401,11 +302,16 @@ async def get_projects(
     limit: int = Query(10, ge=1, le=100),
     search: str = Query(""),
     sort_by: str = Query("created_at"),
-    sort_order: str = Query("desc"),
-    db: AsyncIOMotorDatabase = Depends(get_db)
+    sort_order: str = Query("desc", enum=["asc", "desc"]),
+    cursor: Optional[str] = Query(None),
+    include_total: bool = Query(True),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    loaders: Loaders = Depends(get_loaders)
 ):
     """Get paginated list of projects"""
     try:
+        sort_by = validate_sort("projects", sort_by)
+
         # Build query
         query = {}
         if search:
@@ -415,28 +321,24 @@ async def get_projects(
             ]
 
         # Get total count
-        total = await db.projects.count_documents(query)
-
-        # Sort direction
-        sort_direction = -1 if sort_order.lower() == "desc" else 1
+        total = await cached_count(db.projects, query) if include_total else None
 
         # Get projects with pagination
-        projects = await db.projects.find(query) \
-            .sort(sort_by, sort_direction) \
-            .skip((page - 1) * limit) \
-            .limit(limit) \
-            .to_list(length=None)
+        projects, next_cursor = await keyset_page(
+            db.projects, query, sort_by, sort_order, limit, cursor=cursor, page=page
+        )
+
+        # Get owners and diagram counts for the whole page at once
+        users = await _users_by_id(loaders, [project.get("user_id") for project in projects])
+        diagram_counts = await _count_by(
+            db, "diagrams", "project_id", [str(project["_id"]) for project in projects]
+        )
 
         # Process projects for response
         project_list = []
         for project in projects:
-            # Get user info
-            user = await db.users.find_one({"_id": ObjectId(project["user_id"])})
-            
-            # Get diagrams count
-            diagrams_count = await db.diagrams.count_documents({
-                "project_id": str(project["_id"])
-            })
+            user = users.get(str(project.get("user_id")))
+            diagrams_count = diagram_counts.get(str(project["_id"]), 0)
             
             project_list.append({
                 "id": str(project["_id"]),
@@ -458,9 +360,12 @@ async def get_projects(
             "total": total,
             "page": page,
             "limit": limit,
-            "pages": math.ceil(total / limit) if total > 0 else 1
+            "pages": (math.ceil(total / limit) if total > 0 else 1) if total is not None else None,
+            "next_cursor": next_cursor
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting projects: {str(e)}")
         raise HTTPException(
@@ -471,9 +376,12 @@ async def get_projects(
 @router.get("/projects/{project_id}")
 async def get_project(
     project_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Get project details by ID"""
+    """Get project details with its newest diagrams; the next page's cursor is in X-Next-Cursor"""
     try:
         project = await db.projects.find_one({"_id": ObjectId(project_id)})
         if not project:
@@ -485,18 +393,33 @@ async def get_project(
         # Get user info
         user = await db.users.find_one({"_id": ObjectId(project["user_id"])})
         
-        # Get diagrams with their output URLs
-        diagrams = await db.diagrams.find({
-            "project_id": str(project["_id"])
-        }).to_list(length=None)
+        # Get one page of diagrams with their output URLs
+        diagrams, next_cursor = await keyset_page(
+            db.diagrams,
+            {"project_id": str(project["_id"])},
+            "created_at",
+            "desc",
+            limit,
+            cursor=cursor,
+            projection=resolve_projection("diagrams", required=("name", "description"))
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        
+        # Get the latest output of every diagram in one aggregation
+        diagram_ids = [str(diagram["_id"]) for diagram in diagrams]
+        outputs = {}
+        if diagram_ids:
+            latest_outputs = await db.outputs.aggregate([
+                {"$match": {"diagram_id": {"$in": diagram_ids}}},
+                {"$sort": {"created_at": -1}},
+                {"$group": {"_id": "$diagram_id", "url": {"$first": "$url"}}}
+            ]).to_list(length=None)
+            outputs = {item["_id"]: item for item in latest_outputs}
         
         diagrams_list = []
         for diagram in diagrams:
-            # Get the latest output for the diagram
-            output = await db.outputs.find_one(
-                {"diagram_id": str(diagram["_id"])},
-                sort=[("created_at", -1)]
-            )
+            output = outputs.get(str(diagram["_id"]))
             
             diagrams_list.append({
                 "id": str(diagram["_id"]),
@@ -523,6 +446,8 @@ async def get_project(
             "updated_at": project.get("updated_at", "")
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting project: {str(e)}")
         raise HTTPException(
@@ -538,15 +463,25 @@ async def delete_project(
     """Delete project and its diagrams"""
     try:
         # Delete project
-        result = await db.projects.delete_one({"_id": ObjectId(project_id)})
-        if result.deleted_count == 0:
+        project = await db.projects.find_one_and_delete(
+            {"_id": ObjectId(project_id)},
+            projection={"user_id": 1}
+        )
+        if not project:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Project not found"
             )
 
         # Delete associated diagrams
+        deleted = await usage.breakdown(db, {"project_id": project_id})
         await db.diagrams.delete_many({"project_id": project_id})
+        await counters.apply_counters(
+            db,
+            project["user_id"],
+            counters.merge(counters.project_deleted(), counters.diagrams_deleted(usage.by_status(deleted)))
+        )
+        await usage.remove(db, deleted)
 
         return {"message": "Project and associated diagrams deleted successfully"}
 
@@ -2,8 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import timedelta
 from app.core.security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, verify_google_token
+from app.core.responses import ORJSONRoute
 from app.api.deps import get_db, get_current_user_id
+from app.core.user_cache import invalidate_user
 from app.models.user import UserCreate, User, GoogleSignInRequest
+from app.services import counters
 from datetime import datetime
 from bson import ObjectId
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -12,7 +15,7 @@ import dotenv
 dotenv.load_dotenv()
 getfreePlan = os.getenv("FREE_PLAN_CREDITS")
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 security = HTTPBearer()
 
 @router.post("/google", response_model=dict)
@@ -39,6 +42,7 @@ async def google_signin(
                 "total_credits": int(getfreePlan),
                 "plan": "free",
                 "account_status": "active",
+                "stats": counters.new_user_stats(),
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }
@@ -51,6 +55,7 @@ async def google_signin(
                 {"_id": user["_id"]},
                 {"$set": {"updated_at": datetime.utcnow()}}
             )
+            await invalidate_user(db, user["_id"])
         
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -1,121 +1,99 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, status, BackgroundTasks
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.api.deps import get_db, get_current_active_user
+from app.core.logger import logger
+from app.core.user_cache import invalidate_user
+from app.core.responses import ORJSONRoute
 from app.models.diagram import DiagramCreate, DiagramUpdate
+from app.services import counters, diagram_state, usage
 from datetime import datetime
 from bson import ObjectId
-import aiohttp
-import os
-from PIL import Image
-import io
-from app.services.diagram_generator import DiagramGenerator
-import traceback
+from pymongo import ReturnDocument
+from functools import lru_cache
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
-# Initialize diagram generator
-diagram_generator = DiagramGenerator()
+@lru_cache()
+def get_diagram_generator():
+    """Create the diagram generator (and its Groq client) on first use"""
+    from app.services.diagram_generator import DiagramGenerator
+    return DiagramGenerator()
 
 @router.post("/generate", response_model=dict)
 async def generate_diagram(
     diagram: DiagramCreate,
     background_tasks: BackgroundTasks,
+    request: Request,
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
+    # Calculate required credits
+    required_credits = 3 if diagram.type == "gif" else 1
+    
+    # Reserve credits: the balance check and the deduction are one atomic write
+    reserved = await db.users.find_one_and_update(
+        {"_id": current_user["_id"], "credits": {"$gte": required_credits}},
+        {"$inc": counters.merge(
+            {"credits": -required_credits},
+            counters.diagram_created(required_credits)
+        )},
+        projection={"_id": 1}
+    )
+    await invalidate_user(db, current_user["_id"], request)
+    if not reserved:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Insufficient credits"
+        )
+    
+    # Create diagram entry
+    now = datetime.utcnow()
+    diagram_dict = {
+        "_id": str(ObjectId()),
+        "user_id": current_user["_id"],
+        "project_id": diagram.project_id,
+        "prompt": diagram.prompt,
+        "type": diagram.type,
+        "diagramType": diagram.generation_type,
+        "url": "",  # Will be updated after generation
+        "frames": [],  # For GIFs
+        "credits_used": required_credits,
+        "status": "processing",
+        "created_at": now,
+        "updated_at": now
+    }
+    
     try:
-        # Check user credits
-        user = await db.users.find_one({"_id": current_user["_id"]})
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        # Calculate required credits
-        required_credits = 3 if diagram.type == "gif" else 1
-        if user["credits"] < required_credits:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Insufficient credits"
-            )
-        
-        # Create diagram entry
-        diagram_dict = {
-            "_id": str(ObjectId()),
-            "user_id": current_user["_id"],
-            "project_id": diagram.project_id,
-            "prompt": diagram.prompt,
-            "type": diagram.type,
-            "diagramType": diagram.generation_type,
-            "url": "",  # Will be updated after generation
-            "frames": [],  # For GIFs
-            "credits_used": required_credits,
-            "status": "processing",
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        
-        # Insert diagram with initial status
         await db.diagrams.insert_one(diagram_dict)
+    except Exception as e:
+        logger.exception(f"Error in generate_diagram: {str(e)}")
         
-        # Update status to processing
-        await db.diagrams.update_one(
-            {"_id": diagram_dict["_id"]},
-            {
-                "$set": {
-                    "status": "processing",
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        # Deduct credits
+        # Compensate the reservation; the diagram never existed
         await db.users.update_one(
             {"_id": current_user["_id"]},
-            {"$inc": {"credits": -required_credits}}
-        )
-        
-        # Generate diagram in background
-        background_tasks.add_task(
-            generate_and_update_diagram,
-            db,
-            diagram_dict["_id"],
-            diagram.prompt,
-            diagram.type,
-            diagram.generation_type
+            {"$inc": counters.merge(
+                counters.credits_refunded(required_credits),
+                {"stats.total_diagrams": -1}
+            )}
         )
-        
-        return diagram_dict
-        
-    except Exception as e:
-        # Log the error
-        print(f"Error in generate_diagram: {str(e)}")
-        print(traceback.format_exc())
-        
-        # Update diagram with error status if it was created
-        if 'diagram_dict' in locals():
-            await db.diagrams.update_one(
-                {"_id": diagram_dict["_id"]},
-                {
-                    "$set": {
-                        "status": "failed",
-                        "error": str(e),
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            
-            # Refund credits
-            await db.users.update_one(
-                {"_id": current_user["_id"]},
-                {"$inc": {"credits": required_credits}}
-            )
+        await invalidate_user(db, current_user["_id"], request)
         
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate diagram: {str(e)}"
         )
+    
+    await usage.record_created(db, diagram_dict)
+    
+    # Generate diagram in background
+    background_tasks.add_task(
+        generate_and_update_diagram,
+        db,
+        dict(diagram_dict),
+        writes=3  # credit reservation, insert, usage rollup
+    )
+    
+    return diagram_dict
 
 @router.get("/{diagram_id}", response_model=dict)
 async def get_diagram(
@@ -143,11 +121,26 @@ async def update_diagram(
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    # Check if diagram exists and belongs to user
-    diagram = await db.diagrams.find_one({
-        "_id": diagram_id,
-        "user_id": current_user["_id"]
-    })
+    # Update diagram; ownership is part of the filter
+    owned = {"_id": diagram_id, "user_id": current_user["_id"]}
+    update_data = diagram_update.dict(exclude_unset=True)
+    if not update_data:
+        diagram = await db.diagrams.find_one(owned)
+        if not diagram:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Diagram not found"
+            )
+        return diagram
+    
+    update_data["updated_at"] = datetime.utcnow()
+    status_changed = "status" in update_data
+    # A status change needs the previous status for the counters
+    diagram = await db.diagrams.find_one_and_update(
+        owned,
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE if status_changed else ReturnDocument.AFTER
+    )
     
     if not diagram:
         raise HTTPException(
@@ -155,22 +148,16 @@ async def update_diagram(
             detail="Diagram not found"
         )
     
-    # Update diagram
-    update_data = diagram_update.dict(exclude_unset=True)
-    if update_data:
-        update_data["updated_at"] = datetime.utcnow()
-        result = await db.diagrams.update_one(
-            {"_id": diagram_id},
-            {"$set": update_data}
+    if status_changed:
+        await counters.apply_counters(
+            db,
+            current_user["_id"],
+            counters.diagram_status_changed(diagram.get("status"), update_data["status"])
         )
-        
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Diagram update failed"
-            )
+        await usage.record_status_change(db, diagram, diagram.get("status"), update_data["status"])
+        diagram = {**diagram, **update_data}
     
-    return await db.diagrams.find_one({"_id": diagram_id})
+    return diagram
 
 @router.delete("/{diagram_id}")
 async def delete_diagram(
@@ -178,11 +165,11 @@ async def delete_diagram(
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    # Check if diagram exists and belongs to user
-    diagram = await db.diagrams.find_one({
-        "_id": diagram_id,
-        "user_id": current_user["_id"]
-    })
+    # Delete diagram if it belongs to user
+    diagram = await db.diagrams.find_one_and_delete(
+        {"_id": diagram_id, "user_id": current_user["_id"]},
+        projection={"user_id": 1, "status": 1, "type": 1, "created_at": 1}
+    )
     
     if not diagram:
         raise HTTPException(
@@ -190,14 +177,8 @@ async def delete_diagram(
             detail="Diagram not found"
         )
     
-    # Delete diagram
-    result = await db.diagrams.delete_one({"_id": diagram_id})
-    
-    if result.deleted_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Diagram deletion failed"
-        )
+    await counters.apply_counters(db, current_user["_id"], counters.diagram_deleted(diagram))
+    await usage.record_deleted(db, diagram)
     
     # TODO: Delete diagram files from storage
     
@@ -205,57 +186,21 @@ async def delete_diagram(
 
 async def generate_and_update_diagram(
     db: AsyncIOMotorDatabase,
-    diagram_id: str,
-    prompt: str,
-    diagram_type: str,
-    generation_type: str
+    diagram: dict,
+    writes: int = 0
 ):
+    """Generate a "processing" diagram and move it to its final status"""
     try:
-        # Update status to generating
-        await db.diagrams.update_one(
-            {"_id": diagram_id},
-            {
-                "$set": {
-                    "status": "generating",
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        # Generate diagram
-        url, _ = await diagram_generator.generate_diagram(prompt, diagram_type,generation_type)
-        
-        # Update diagram with generated URL
-        await db.diagrams.update_one(
-            {"_id": diagram_id},
-            {
-                "$set": {
-                    "url": url,
-                    "status": "completed",
-                    "updated_at": datetime.utcnow()
-                }
-            }
+        url, _ = await get_diagram_generator().generate_diagram(
+            diagram["prompt"],
+            diagram["type"],
+            diagram["diagramType"]
         )
     except Exception as e:
-        print(f"Error in generate_and_update_diagram: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error in generate_and_update_diagram: {str(e)}")
         
-        # Update diagram with error status
-        await db.diagrams.update_one(
-            {"_id": diagram_id},
-            {
-                "$set": {
-                    "status": "failed",
-                    "error": str(e),
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        # Refund credits to user
-        diagram = await db.diagrams.find_one({"_id": diagram_id})
-        if diagram:
-            await db.users.update_one(
-                {"_id": diagram["user_id"]},
-                {"$inc": {"credits": diagram["credits_used"]}}
-            )
+        # Mark failed and refund credits with the data we already have
+        await diagram_state.transition(db, diagram, "failed", writes=writes, error=str(e))
+        return
+    
+    await diagram_state.transition(db, diagram, "completed", writes=writes, url=url)
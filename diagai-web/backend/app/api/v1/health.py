@@ -2,11 +2,13 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.api.deps import get_db, get_current_admin_user
 from app.core.config import get_settings
+from app.core.profiling import startup_profiler
+from app.core.responses import ORJSONRoute
 import psutil
 import os
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 settings = get_settings()
 
 @router.get("/", response_model=dict)
@@ -103,6 +105,13 @@ async def storage_health():
             detail=f"Storage health check failed: {str(e)}"
         )
 
+@router.get("/startup", response_model=dict)
+async def startup_profile(
+    admin_user: dict = Depends(get_current_admin_user)
+):
+    """Startup profile: import times per module and startup phase timings (admin only)"""
+    return startup_profiler.report()
+
 @router.get("/full", response_model=dict)
 async def full_health_check(
     db: AsyncIOMotorDatabase = Depends(get_db),
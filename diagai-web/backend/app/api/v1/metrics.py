@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.api.deps import get_db, get_current_active_user
+from app.core.responses import ORJSONRoute
+from app.services import counters, usage
 from datetime import datetime, timedelta
 from typing import List
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
 @router.get("/usage", response_model=dict)
 async def get_usage_metrics(
@@ -13,23 +15,14 @@ async def get_usage_metrics(
 ):
     """Get user's usage metrics"""
     # Get total diagrams created
-    total_diagrams = await db.diagrams.count_documents({
-        "user_id": current_user["_id"]
-    })
+    total_diagrams = (await counters.user_stats(db, current_user))["total_diagrams"]
     
-    # Get diagrams created today
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    diagrams_today = await db.diagrams.count_documents({
-        "user_id": current_user["_id"],
-        "created_at": {"$gte": today}
-    })
-    
-    # Get diagrams created this month
+    # Diagrams created today and this month, from the daily usage rollup
+    today = usage.day_of(datetime.utcnow())
     month_start = today.replace(day=1)
-    diagrams_this_month = await db.diagrams.count_documents({
-        "user_id": current_user["_id"],
-        "created_at": {"$gte": month_start}
-    })
+    per_day = await usage.daily_counts(db, current_user["_id"], month_start)
+    diagrams_today = per_day.get(today, 0)
+    diagrams_this_month = sum(per_day.values())
     
     return {
         "total_diagrams": total_diagrams,
@@ -48,50 +41,19 @@ async def get_usage_history(
     """Get user's usage history for the specified number of days"""
     start_date = datetime.utcnow() - timedelta(days=days)
     
-    pipeline = [
-        {
-            "$match": {
-                "user_id": current_user["_id"],
-                "created_at": {"$gte": start_date}
-            }
-        },
-        {
-            "$group": {
-                "_id": {
-                    "year": {"$year": "$created_at"},
-                    "month": {"$month": "$created_at"},
-                    "day": {"$dayOfMonth": "$created_at"}
-                },
-                "count": {"$sum": 1},
-                "date": {"$first": "$created_at"}
-            }
-        },
-        {
-            "$sort": {"date": 1}
-        }
-    ]
-    
-    history = await db.diagrams.aggregate(pipeline).to_list(None)
+    # One range read over the daily rollup
+    per_day = await usage.daily_counts(db, current_user["_id"], start_date)
     
     # Format the response
     formatted_history = []
-    current_date = start_date
+    current_date = usage.day_of(start_date)
     end_date = datetime.utcnow()
     
     while current_date <= end_date:
-        date_entry = {
+        formatted_history.append({
             "date": current_date.strftime("%Y-%m-%d"),
-            "count": 0
-        }
-        
-        # Find matching entry from aggregation
-        for entry in history:
-            entry_date = entry["date"].replace(hour=0, minute=0, second=0, microsecond=0)
-            if entry_date == current_date.replace(hour=0, minute=0, second=0, microsecond=0):
-                date_entry["count"] = entry["count"]
-                break
-        
-        formatted_history.append(date_entry)
+            "count": per_day.get(current_date, 0)
+        })
         current_date += timedelta(days=1)
     
     return formatted_history
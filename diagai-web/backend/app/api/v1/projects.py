@@ -1,19 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.api.deps import get_db, get_current_active_user
 from app.models.project import ProjectCreate, ProjectUpdate
+from app.core.etag import conditional
+from app.core.pagination import keyset_cursor, keyset_page
+from app.core.projections import resolve_projection
+from app.core.responses import ORJSONRoute
+from app.core.streaming import ndjson_response
+from app.services import counters, usage
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
 from typing import List, Optional
+import asyncio
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
 @router.get("/", response_model=List[dict])
 async def get_projects(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: str = Query("json", enum=["json", "ndjson"]),
+    view: str = Query("summary", enum=["summary", "full"]),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return; overrides view"),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    projects = await db.projects.find({"user_id": current_user["_id"]}).to_list(None)
+    """Get user's projects, oldest first; the next page's cursor is in X-Next-Cursor.
+
+    format=ndjson streams every project from the cursor on, one per line.
+    """
+    query = {"user_id": current_user["_id"]}
+    projection = resolve_projection("projects", view, fields)
+    if format == "ndjson":
+        return ndjson_response(keyset_cursor(db.projects, query, "created_at", "asc", cursor, projection))
+    
+    # Every change to a project sets updated_at and deletes change the count. Both
+    # are read fresh, not from the (possibly cached) user, so a 304 is never stale.
+    total, latest = await asyncio.gather(
+        db.projects.count_documents(query),
+        db.projects.find_one(query, {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)])
+    )
+    not_modified = conditional(request, response, total, latest and latest.get("updated_at"))
+    if not_modified:
+        return not_modified
+    
+    projects, next_cursor = await keyset_page(
+        db.projects, query, "created_at", "asc", limit, cursor=cursor, projection=projection
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return projects
 
 @router.post("/", response_model=dict)
@@ -33,14 +71,23 @@ async def create_project(
     }
     
     await db.projects.insert_one(project_dict)
+    await counters.apply_counters(db, current_user["_id"], counters.project_created())
     return project_dict
 
 @router.get("/{project_id}", response_model=dict)
 async def get_project(
     project_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: str = Query("json", enum=["json", "ndjson"]),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
+    """Get a project with its newest diagrams; the next page's cursor is in X-Next-Cursor.
+
+    format=ndjson streams the project on the first line, then every diagram.
+    """
     project = await db.projects.find_one({
         "_id": project_id,
         "user_id": current_user["_id"]
@@ -53,9 +100,20 @@ async def get_project(
         )
     
     # Get project diagrams
-    diagrams = await db.diagrams.find({
-        "project_id": project_id
-    }).to_list(None)
+    query = {"project_id": project_id}
+    projection = resolve_projection("diagrams", "full")
+    if format == "ndjson":
+        project.pop("diagrams", None)
+        return ndjson_response(
+            keyset_cursor(db.diagrams, query, "created_at", "desc", cursor, projection),
+            head=project
+        )
+    
+    diagrams, next_cursor = await keyset_page(
+        db.diagrams, query, "created_at", "desc", limit, cursor=cursor, projection=projection
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     project["diagrams"] = diagrams
     return project
@@ -63,12 +121,22 @@ async def get_project(
 @router.get("/{project_id}/diagrams", response_model=List[dict])
 async def get_project_diagrams(
     project_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    format: str = Query("json", enum=["json", "ndjson"]),
     status: Optional[str] = Query(None, enum=["completed", "failed"]),
     type: Optional[str] = Query(None, enum=["image", "gif"]),
+    view: str = Query("full", enum=["summary", "full"]),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return; overrides view"),
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Get project diagrams with optional status and type filters"""
+    """Get project diagrams, newest first, with optional status and type filters.
+
+    The next page's cursor is in X-Next-Cursor; format=ndjson streams every
+    matching diagram from the cursor on, one per line.
+    """
     # Verify project exists and belongs to user
     project = await db.projects.find_one({
         "_id": project_id,
@@ -77,7 +145,7 @@ async def get_project_diagrams(
     
     if not project:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
+            status_code=404,  # `status` is the filter parameter here
             detail="Project not found"
         )
     
@@ -89,7 +157,15 @@ async def get_project_diagrams(
         query["type"] = type
     
     # Get diagrams with filters
-    diagrams = await db.diagrams.find(query).sort("created_at", -1).to_list(None)
+    projection = resolve_projection("diagrams", view, fields)
+    if format == "ndjson":
+        return ndjson_response(keyset_cursor(db.diagrams, query, "created_at", "desc", cursor, projection))
+    
+    diagrams, next_cursor = await keyset_page(
+        db.diagrams, query, "created_at", "desc", limit, cursor=cursor, projection=projection
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return diagrams
 
 @router.patch("/{project_id}", response_model=dict)
@@ -99,11 +175,18 @@ async def update_project(
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    # Check if project exists and belongs to user
-    project = await db.projects.find_one({
-        "_id": project_id,
-        "user_id": current_user["_id"]
-    })
+    # Update project; ownership is part of the filter
+    owned = {"_id": project_id, "user_id": current_user["_id"]}
+    update_data = project_update.dict(exclude_unset=True)
+    if update_data:
+        update_data["updated_at"] = datetime.utcnow()
+        project = await db.projects.find_one_and_update(
+            owned,
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
+        )
+    else:
+        project = await db.projects.find_one(owned)
     
     if not project:
         raise HTTPException(
@@ -111,22 +194,7 @@ async def update_project(
             detail="Project not found"
         )
     
-    # Update project
-    update_data = project_update.dict(exclude_unset=True)
-    if update_data:
-        update_data["updated_at"] = datetime.utcnow()
-        result = await db.projects.update_one(
-            {"_id": project_id},
-            {"$set": update_data}
-        )
-        
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Project update failed"
-            )
-    
-    return await db.projects.find_one({"_id": project_id})
+    return project
 
 @router.delete("/{project_id}")
 async def delete_project(
@@ -134,11 +202,11 @@ async def delete_project(
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    # Check if project exists and belongs to user
-    project = await db.projects.find_one({
-        "_id": project_id,
-        "user_id": current_user["_id"]
-    })
+    # Delete project if it belongs to user
+    project = await db.projects.find_one_and_delete(
+        {"_id": project_id, "user_id": current_user["_id"]},
+        projection={"_id": 1}
+    )
     
     if not project:
         raise HTTPException(
@@ -147,15 +215,14 @@ async def delete_project(
         )
     
     # Delete all diagrams in the project
+    deleted = await usage.breakdown(db, {"project_id": project_id})
     await db.diagrams.delete_many({"project_id": project_id})
     
-    # Delete project
-    result = await db.projects.delete_one({"_id": project_id})
-    
-    if result.deleted_count == 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Project deletion failed"
-        )
+    await counters.apply_counters(
+        db,
+        current_user["_id"],
+        counters.merge(counters.project_deleted(), counters.diagrams_deleted(usage.by_status(deleted)))
+    )
+    await usage.remove(db, deleted)
     
     return {"message": "Project deleted successfully"}
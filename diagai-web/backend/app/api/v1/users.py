@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, Body
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.api.deps import get_db, get_current_active_user
+from app.core.user_cache import invalidate_user
 from app.models.user import UserUpdate, User, UpgradeRequest, ContactRequest
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import ReturnDocument
+from app.core.etag import conditional
+from app.core.pagination import keyset_page
+from app.core.projections import resolve_projection
+from app.core.responses import ORJSONRoute
 from app.core.security import verify_google_token, create_access_token
+from app.services import counters, usage
 from pydantic import BaseModel
 from typing import Optional
 from fastapi.security import OAuth2PasswordBearer
@@ -29,7 +36,7 @@ class ContactRequest(BaseModel):
     phone: Optional[str] = None
     message: str
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
 @router.get("/me", response_model=dict)
 async def get_current_user_info(
@@ -46,31 +53,40 @@ async def update_user(
 ):
     # Update user fields
     update_data = user_update.dict(exclude_unset=True)
-    if update_data:
-        update_data["updated_at"] = datetime.utcnow()
-        result = await db.users.update_one(
-            {"_id": current_user["_id"]},
-            {"$set": update_data}
+    if not update_data:
+        return current_user
+    
+    update_data["updated_at"] = datetime.utcnow()
+    user = await db.users.find_one_and_update(
+        {"_id": current_user["_id"]},
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
+    )
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
         )
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User update failed"
-            )
+    await invalidate_user(db, current_user["_id"])
     
-    return await db.users.find_one({"_id": current_user["_id"]})
+    return user
 
 @router.get("/credits", response_model=dict)
 async def get_user_credits(
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    # Get usage statistics
-    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    daily_usage = await db.diagrams.count_documents({
-        "user_id": current_user["_id"],
-        "created_at": {"$gte": today}
-    })
+    today = usage.day_of(datetime.utcnow())
+    # Today's diagrams come from the usage rollup, so the count doubles as its own version
+    daily_usage = sum((await usage.daily_counts(db, current_user["_id"], today)).values())
+    not_modified = conditional(
+        request, response,
+        current_user["_id"], current_user.get("credits"), current_user.get("plan"), today, daily_usage
+    )
+    if not_modified:
+        return not_modified
     
     return {
         "credits": current_user["credits"],
@@ -80,22 +96,31 @@ async def get_user_credits(
 
 @router.get("/dashboard", response_model=dict)
 async def get_dashboard_stats(
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get user's dashboard statistics"""
-    # Get user's diagrams count
-    total_diagrams = await db.diagrams.count_documents({"user_id": str(current_user["_id"])})
+    # Every write to these fields (counters included) invalidates the cached user
+    not_modified = conditional(
+        request, response,
+        current_user["_id"], current_user.get("stats"),
+        *(current_user.get(field) for field in ("credits", "total_credits", "plan", "name", "email"))
+    )
+    if not_modified:
+        return not_modified
+    
+    # Counters are maintained on the user document (see app.services.counters)
+    user_stats = await counters.user_stats(db, current_user)
+    total_diagrams = user_stats["total_diagrams"]
     
     # Calculate credits usage
     total_credits = current_user.get("credits", 0)
     getTotalCredits = current_user.get("total_credits", 0)
     avlCredits = current_user.get("credits", 0)
-    getTotalProjects = await db.projects.count_documents({"user_id": str(current_user["_id"])})
-    credits_used = await db.diagrams.count_documents({
-        "user_id": str(current_user["_id"]),
-        "status": "completed"
-    })
+    getTotalProjects = user_stats["total_projects"]
+    credits_used = user_stats["completed_diagrams"]
 
     return {
         "stats": {
@@ -115,19 +140,29 @@ async def get_dashboard_stats(
 
 @router.get("/diagrams", response_model=list)
 async def get_user_diagrams(
+    response: Response,
     current_user: dict = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_db),
-    limit: int = 10
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    view: str = Query("full", enum=["summary", "full"]),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return; overrides view")
 ):
-    """Get user's diagrams"""
-    cursor = db.diagrams.find(
-        {"user_id": str(current_user["_id"])}
-    ).sort("created_at", -1).limit(limit)
+    """Get user's diagrams, newest first; the next page's cursor is in X-Next-Cursor"""
+    diagrams, next_cursor = await keyset_page(
+        db.diagrams,
+        {"user_id": str(current_user["_id"])},
+        "created_at",
+        "desc",
+        limit,
+        cursor=cursor,
+        projection=resolve_projection("diagrams", view, fields)
+    )
     
-    diagrams = []
-    async for diagram in cursor:
+    for diagram in diagrams:
         diagram["id"] = str(diagram["_id"])
-        diagrams.append(diagram)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     return diagrams
 
@@ -161,7 +196,8 @@ async def google_auth(
                 "is_active": True,
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow(),
-                "credits": 100  # Default credits for new users
+                "credits": 100,  # Default credits for new users
+                "stats": counters.new_user_stats()
             }
             await db.users.insert_one(user)
         else:
@@ -175,6 +211,7 @@ async def google_auth(
                     "firebase_uid": firebase_uid
                 }}
             )
+            await invalidate_user(db, user["_id"])
         
         # Create access token
         access_token = create_access_token(
@@ -222,6 +259,7 @@ async def upgrade_user(
             {"_id": ObjectId(upgrade_request.user_id)},
             {"$set": {"pending_upgrade": upgrade_request.plan}}
         )
+        await invalidate_user(db, upgrade_request.user_id)
         
         return {
             "message": "Upgrade request submitted successfully",
@@ -261,56 +299,37 @@ async def get_credits_usage(
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """Get daily and monthly credits usage statistics"""
-    from datetime import datetime, timedelta
-    import calendar
-
     # Get current date and first day of current month
-    today = datetime.utcnow()
-    start_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_of_month = today.replace(day=1)
+    
+    # First day of each of the last 6 months, newest first
+    month_starts = [start_of_month]
+    for _ in range(5):
+        previous = month_starts[-1] - timedelta(days=1)
+        month_starts.append(previous.replace(day=1))
+    
+    # One range read over the daily rollup covers both charts
+    per_day = await usage.daily_counts(db, current_user["_id"], month_starts[-1], status="completed")
     
     # Get last 7 days for daily stats
     daily_stats = []
     for i in range(7):
-        date = today - timedelta(days=i)
-        start_of_day = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_day = start_of_day + timedelta(days=1)
-        
-        count = await db.diagrams.count_documents({
-            "user_id": str(current_user["_id"]),
-            "created_at": {
-                "$gte": start_of_day,
-                "$lt": end_of_day
-            },
-            "status": "completed"
-        })
-        
+        start_of_day = today - timedelta(days=i)
         daily_stats.append({
             "date": start_of_day.strftime("%Y-%m-%d"),
-            "count": count
+            "count": per_day.get(start_of_day, 0)
         })
     
     # Get last 6 months for monthly stats
-    monthly_stats = []
-    for i in range(6):
-        date = start_of_month - timedelta(days=30*i)
-        end_of_month = date.replace(
-            day=calendar.monthrange(date.year, date.month)[1],
-            hour=23, minute=59, second=59
-        )
-        
-        count = await db.diagrams.count_documents({
-            "user_id": str(current_user["_id"]),
-            "created_at": {
-                "$gte": date,
-                "$lt": end_of_month
-            },
-            "status": "completed"
-        })
-        
-        monthly_stats.append({
-            "month": date.strftime("%Y-%m"),
-            "count": count
-        })
+    per_month = {}
+    for day, count in per_day.items():
+        month = day.strftime("%Y-%m")
+        per_month[month] = per_month.get(month, 0) + count
+    monthly_stats = [
+        {"month": month.strftime("%Y-%m"), "count": per_month.get(month.strftime("%Y-%m"), 0)}
+        for month in month_starts
+    ]
     
     return {
         "daily": list(reversed(daily_stats)),
@@ -1,9 +1,18 @@
 from typing import Any, Optional, Dict
 from datetime import datetime, timedelta
+import asyncio
 import json
+import os
+import sqlite3
+import time
+import bson
+from app.core.config import get_settings
 from app.core.logger import logger
+from app.core.metrics import CACHE_HITS, CACHE_MISSES
 import threading
 
+settings = get_settings()
+
 class MemoryCache:
     def __init__(self):
         self.cache: Dict[str, Dict[str, Any]] = {}
@@ -107,5 +116,248 @@ class MemoryCache:
         with self._lock:
             self.cache.clear()
 
+class DiskCache:
+    """SQLite-backed cache shared by all workers on a host.
+
+    Entries are BSON-encoded into a single table (so reading the file never
+    runs code) and evicted least-recently-used first once the total payload
+    size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.prefix = "diagai:"
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _get_key(self, key: str) -> str:
+        """Get prefixed key"""
+        return f"{self.prefix}{key}"
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database lazily; WAL lets several workers read while one writes"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _get(self, key: str):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, None
+            value, expires_at = row
+            now = time.time()
+            if expires_at is not None and expires_at < now:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                conn.commit()
+                return None, None
+            try:
+                data = bson.decode(value)["v"]
+            except (bson.errors.InvalidBSON, KeyError):
+                # Written by an older version (pickle); treat as a miss
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                conn.commit()
+                return None, None
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+        return data, expires_at
+
+    def _set(self, key: str, value: Any, expire: Optional[int]) -> None:
+        payload = bson.encode({"v": value})
+        now = time.time()
+        expires_at = now + expire if expire else None
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), expires_at, now)
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired rows, then least recently used rows until under max_bytes"""
+        conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute("SELECT key, size FROM cache ORDER BY accessed_at").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM cache WHERE key = ?", evicted)
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            conn.commit()
+
+    def _clear_prefix(self, prefix: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
+            conn.commit()
+
+    async def get_with_expiry(self, key: str):
+        """Get value and its absolute expiry (epoch seconds) from disk"""
+        key = self._get_key(key)
+        try:
+            return await asyncio.to_thread(self._get, key)
+        except Exception as e:
+            logger.error(f"Disk cache get failed for key {key}: {str(e)}")
+            return None, None
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get value from disk cache"""
+        value, _ = await self.get_with_expiry(key)
+        return value
+
+    async def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
+        """Set value in disk cache with optional expiration in seconds"""
+        key = self._get_key(key)
+        try:
+            await asyncio.to_thread(self._set, key, value, expire)
+            return True
+        except Exception as e:
+            logger.error(f"Disk cache set failed for key {key}: {str(e)}")
+            return False
+
+    async def delete(self, key: str) -> bool:
+        """Delete value from disk cache"""
+        key = self._get_key(key)
+        try:
+            await asyncio.to_thread(self._delete, key)
+            return True
+        except Exception as e:
+            logger.error(f"Disk cache delete failed for key {key}: {str(e)}")
+            return False
+
+    async def clear_prefix(self, prefix: str) -> bool:
+        """Clear all keys with prefix"""
+        prefix = self._get_key(prefix)
+        try:
+            await asyncio.to_thread(self._clear_prefix, prefix)
+            return True
+        except Exception as e:
+            logger.error(f"Disk cache clear prefix failed for {prefix}: {str(e)}")
+            return False
+
+    async def init(self):
+        """Open the database file"""
+        await asyncio.to_thread(self._connect)
+
+    async def close(self):
+        """Close the database file; entries persist across restarts"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+class TieredCache:
+    """In-process L1 in front of an optional on-disk L2.
+
+    Reads fall through L1 -> L2 and promote L2 hits into L1. Writes go to
+    both tiers. Hits and misses are counted per tier.
+    """
+
+    def __init__(self, l1: MemoryCache, l2: Optional[DiskCache] = None, l1_ttl: int = 300):
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_ttl = l1_ttl
+
+    def _l1_expire(self, expire: Optional[int]) -> int:
+        """L1 entries never outlive the L1 TTL so workers converge on L2"""
+        return min(expire, self.l1_ttl) if expire else self.l1_ttl
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get value from L1, falling back to L2"""
+        value = await self.l1.get(key)
+        if value is not None:
+            CACHE_HITS.labels(cache_type="l1").inc()
+            return value
+        CACHE_MISSES.labels(cache_type="l1").inc()
+
+        if self.l2 is None:
+            return None
+
+        value, expires_at = await self.l2.get_with_expiry(key)
+        if value is None:
+            CACHE_MISSES.labels(cache_type="l2").inc()
+            return None
+        CACHE_HITS.labels(cache_type="l2").inc()
+
+        # Promote to L1 without extending the L2 lifetime
+        remaining = int(expires_at - time.time()) if expires_at else None
+        if remaining is None or remaining > 0:
+            await self.l1.set(key, value, expire=self._l1_expire(remaining))
+        return value
+
+    async def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
+        """Set value in both tiers with optional expiration in seconds"""
+        result = await self.l1.set(key, value, expire=self._l1_expire(expire))
+        if self.l2 is not None:
+            result = await self.l2.set(key, value, expire=expire) and result
+        return result
+
+    async def delete(self, key: str) -> bool:
+        """Delete value from both tiers"""
+        result = await self.l1.delete(key)
+        if self.l2 is not None:
+            result = await self.l2.delete(key) and result
+        return result
+
+    async def clear_prefix(self, prefix: str) -> bool:
+        """Clear all keys with prefix from both tiers"""
+        result = await self.l1.clear_prefix(prefix)
+        if self.l2 is not None:
+            result = await self.l2.clear_prefix(prefix) and result
+        return result
+
+    async def init(self):
+        """Initialize cache tiers"""
+        await self.l1.init()
+        if self.l2 is not None:
+            await self.l2.init()
+
+    async def close(self):
+        """Clear L1 and close L2"""
+        await self.l1.close()
+        if self.l2 is not None:
+            await self.l2.close()
+
 # Create cache instance
-cache = MemoryCache()
+cache = TieredCache(
+    MemoryCache(),
+    DiskCache(settings.CACHE_L2_PATH, settings.CACHE_L2_MAX_BYTES) if settings.CACHE_L2_ENABLED else None,
+    l1_ttl=settings.CACHE_L1_TTL
+)
@@ -51,6 +51,9 @@ class Settings(BaseSettings):
     FIREBASE_PRIVATE_KEY: str = Field(default="")
     FIREBASE_CLIENT_EMAIL: str = Field(default="")
     FIREBASE_CREDENTIALS: str = Field(default="firebase-credentials.json")
+    FIREBASE_VERIFY_WORKERS: int = Field(default=4)
+    FIREBASE_REVOCATION_CACHE_TTL: int = Field(default=60)
+    FIREBASE_CERT_REFRESH_INTERVAL: int = Field(default=3600)
     
     # Storage settings
     STORAGE_PATH: str = Field(default="storage")
@@ -74,10 +77,53 @@ class Settings(BaseSettings):
     # Logging
     LOG_LEVEL: str = Field(default="INFO")
     LOG_FORMAT: str = Field(default="json")
-    LOG_FILE: str = Field(default="app.log")
+    LOG_FILE: str = Field(default="logs/app.log")
+    LOG_MAX_BYTES: int = Field(default=10 * 1024 * 1024)
+    LOG_BACKUP_COUNT: int = Field(default=5)
+    # Fraction of successful, fast requests that are logged; errors and slow requests always are
+    LOG_SAMPLE_RATE: float = Field(default=1.0)
+    LOG_SLOW_REQUEST_MS: int = Field(default=1000)
+    # Request headers written to the log; credentials are never written
+    LOG_HEADERS: List[str] = Field(default=[
+        "user-agent", "referer", "origin", "content-type", "content-length",
+        "x-forwarded-for", "x-request-id"
+    ])
+    # Query parameters written to the log; others are noted as present, never with their value
+    LOG_QUERY_PARAMS: List[str] = Field(default=[
+        "page", "limit", "cursor", "sort_by", "sort_order", "include_total",
+        "format", "view", "fields", "type", "status", "refresh"
+    ])
+    
+    # Cache
+    CACHE_L1_TTL: int = Field(default=300)
+    CACHE_L2_ENABLED: bool = Field(default=False)
+    CACHE_L2_PATH: str = Field(default="cache/diagai-cache.sqlite3")
+    CACHE_L2_MAX_BYTES: int = Field(default=512 * 1024 * 1024)
+    CACHE_RENDER_TTL: int = Field(default=7 * 24 * 3600)
+    USER_CACHE_TTL: int = Field(default=30)
+    # How often each worker picks up user cache invalidations made by other workers
+    USER_INVALIDATION_POLL_INTERVAL: float = Field(default=1.0)
+    PAGINATION_COUNT_TTL: int = Field(default=30)
+    # Deepest row a page number (offset) may reach; further pages need the cursor
+    PAGINATION_MAX_OFFSET: int = Field(default=1000)
+    
+    # Response compression
+    COMPRESSION_MIN_SIZE: int = Field(default=1024)
+    COMPRESSION_OFFLOAD_SIZE: int = Field(default=256 * 1024)
+    COMPRESSION_GZIP_LEVEL: int = Field(default=6)
+    COMPRESSION_BROTLI_QUALITY: int = Field(default=5)
+    
+    # Scheduler
+    SCHEDULER_LEASE_TTL: int = Field(default=30)
+    ADMIN_STATS_REFRESH_INTERVAL: int = Field(default=60)
     
     # Metrics
     ENABLE_METRICS: bool = Field(default=True)
+    EVENT_LOOP_LAG_INTERVAL: float = Field(default=0.5)
+    DB_SLOW_QUERY_MS: int = Field(default=100)
+    # Re-encodes every reply to size it; for profiling, not always-on
+    DB_COUNT_REPLY_BYTES: bool = Field(default=False)
+    METRICS_MAX_ROUTES: int = Field(default=200)
     METRICS_AUTH_TOKEN: str = Field(default="your-metrics-auth-token")
     
     # Plan credits
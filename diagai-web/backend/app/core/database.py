@@ -1,6 +1,7 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.server_api import ServerApi
 from app.core.config import get_settings
+from app.core.db_monitoring import command_listener, pool_listener
 
 settings = get_settings()
 
@@ -14,7 +15,8 @@ class Database:
                 self.client = AsyncIOMotorClient(
                     settings.MONGODB_URL,
                     server_api=ServerApi('1'),
-                    serverSelectionTimeoutMS=5000
+                    serverSelectionTimeoutMS=5000,
+                    event_listeners=[command_listener, pool_listener]
                 )
                 await self.client.admin.command('ping')
                 print("Successfully connected to MongoDB")
@@ -30,6 +32,11 @@ class Database:
             self.client = None
             print("MongoDB connection closed")
 
+    async def create_indexes(self):
+        """Create any index from the registry that does not exist yet."""
+        from app.core.indexes import sync_indexes
+        return await sync_indexes(self.get_db())
+
     def get_db(self):
         """Get database instance."""
         if self.client is None:
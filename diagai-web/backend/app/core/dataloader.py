@@ -0,0 +1,122 @@
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.logger import logger
+
+class DataLoader:
+    """Batches and memoizes `_id` lookups on one collection.
+
+    Every `load(id)` made during the same event loop tick is collected and
+    resolved by a single `find({"_id": {"$in": ids}})`. Results (including
+    misses) are memoized for the lifetime of the loader, which is one request.
+    With `fields`, only those fields are fetched.
+    """
+
+    def __init__(self, collection, fields: Optional[Tuple[str, ...]] = None):
+        self.collection = collection
+        self.projection = {field: 1 for field in fields} if fields else None
+        self._futures: Dict[Any, asyncio.Future] = {}
+        self._queue: List[Tuple[Any, asyncio.Future]] = []
+        # Running dispatches; the event loop only keeps weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+
+    def load(self, key: Any) -> "asyncio.Future[Optional[dict]]":
+        """Load a document by id; awaiting the result may batch with other loads"""
+        future = self._futures.get(key)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._futures[key] = future
+        self._queue.append((key, future))
+        if len(self._queue) == 1:
+            # Dispatch after every task already scheduled for this tick has queued its keys
+            loop.call_soon(self._start_dispatch)
+        return future
+
+    async def load_many(self, keys: Iterable[Any]) -> List[Optional[dict]]:
+        """Load several documents with one query; order follows `keys`"""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def is_loaded(self, key: Any) -> bool:
+        """Whether `key` has already been resolved in this request"""
+        future = self._futures.get(key)
+        return future is not None and future.done() and not future.cancelled()
+
+    def prime(self, key: Any, document: Optional[dict]) -> None:
+        """Seed the memo with a document fetched some other way"""
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(document)
+        self._futures[key] = future
+
+    def clear(self, key: Any) -> None:
+        """Forget a memoized document, e.g. after it was written"""
+        self._futures.pop(key, None)
+
+    def _start_dispatch(self) -> None:
+        task = asyncio.ensure_future(self._dispatch())
+        self._tasks.add(task)
+        task.add_done_callback(self._dispatch_done)
+
+    def _dispatch_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Data loader dispatch on {self.collection.name} failed: {task.exception()}")
+
+    async def _dispatch(self) -> None:
+        batch, self._queue = self._queue, []
+        try:
+            documents = await self.collection.find(
+                {"_id": {"$in": [key for key, _ in batch]}}, self.projection
+            ).to_list(length=None)
+        except Exception as e:
+            for key, future in batch:
+                # Failed loads are not memoized so a retry hits the database
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_id = {document["_id"]: document for document in documents}
+        for key, future in batch:
+            if not future.done():
+                future.set_result(by_id.get(key))
+
+class Loaders:
+    """The data loaders of one request, created per collection on first use"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self._db = db
+        self._loaders: Dict[Tuple[str, Optional[Tuple[str, ...]]], DataLoader] = {}
+
+    def __getitem__(self, collection: str) -> DataLoader:
+        return self.projected(collection)
+
+    def projected(self, collection: str, fields: Optional[Iterable[str]] = None) -> DataLoader:
+        """Loader fetching only `fields`; memoized apart from whole-document loads"""
+        key = (collection, tuple(sorted(fields)) if fields else None)
+        loader = self._loaders.get(key)
+        if loader is None:
+            loader = self._loaders[key] = DataLoader(self._db[collection], key[1])
+        return loader
+
+    @property
+    def users(self) -> DataLoader:
+        return self["users"]
+
+    @property
+    def projects(self) -> DataLoader:
+        return self["projects"]
+
+    @property
+    def diagrams(self) -> DataLoader:
+        return self["diagrams"]
+
+def request_loaders(request, db: AsyncIOMotorDatabase) -> Loaders:
+    """Get (or create) the loaders stored on `request.state`"""
+    loaders = getattr(request.state, "loaders", None)
+    if loaders is None:
+        loaders = request.state.loaders = Loaders(db)
+    return loaders
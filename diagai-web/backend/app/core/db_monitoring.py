@@ -0,0 +1,179 @@
+import bson
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+from pymongo import monitoring
+from app.core.config import get_settings
+from app.core.logger import logger
+from app.core.metrics import (
+    DB_CONNECTION_POOL,
+    DB_CONNECTIONS_IN_USE,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_QUERY_ERRORS,
+    DB_QUERY_LATENCY
+)
+
+settings = get_settings()
+
+# Commands that name no collection; the value of their first key is not one
+_DATABASE_COMMANDS = {"ping", "hello", "isMaster", "ismaster", "buildInfo", "endSessions", "dropDatabase"}
+
+def filter_shape(value: Any) -> Any:
+    """Replace literal values in a query with "?" while keeping its structure"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and all(isinstance(item, dict) for item in value):
+        return [filter_shape(item) for item in value]
+    return "?"
+
+def command_filter(command_name: str, command: dict) -> Optional[dict]:
+    """The query document of a command, where it has one"""
+    if command_name == "find":
+        return command.get("filter")
+    if command_name in ("count", "distinct", "findAndModify"):
+        return command.get("query")
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or []
+        return statements[0].get("q") if statements else None
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        if pipeline and "$match" in pipeline[0]:
+            return pipeline[0]["$match"]
+    return None
+
+def command_collection(command_name: str, command: dict) -> str:
+    if command_name == "getMore":
+        return str(command.get("collection", "-"))
+    if command_name in _DATABASE_COMMANDS:
+        return "-"
+    collection = command.get(command_name)
+    return collection if isinstance(collection, str) else "-"
+
+class RequestDBStats:
+    """Database commands, time and reply bytes (with DB_COUNT_REPLY_BYTES)
+    attributed to one request, and the reads it was spared by caches"""
+
+    def __init__(self):
+        self.commands = 0
+        self.duration = 0.0
+        self.bytes = 0
+        self.reads_saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, duration: float, size: int) -> None:
+        # Commands of one request may finish concurrently on executor threads
+        with self._lock:
+            self.commands += 1
+            self.duration += duration
+            self.bytes += size
+
+    def record_saved_read(self) -> None:
+        with self._lock:
+            self.reads_saved += 1
+
+# Set per request by DBBudgetMiddleware. Motor runs commands in a copy of the
+# caller's context, so the listener sees the stats of the request that issued them.
+request_db_stats: ContextVar[Optional[RequestDBStats]] = ContextVar("request_db_stats", default=None)
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Records latency per command and collection and logs slow commands"""
+
+    def __init__(self, slow_query_ms: int, count_reply_bytes: bool = False):
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.count_reply_bytes = count_reply_bytes
+        self._pending: Dict[Tuple[int, Any], Tuple[str, str, Optional[dict]]] = {}
+
+    def started(self, event):
+        self._pending[(event.request_id, event.connection_id)] = (
+            event.database_name,
+            command_collection(event.command_name, event.command),
+            command_filter(event.command_name, event.command)
+        )
+
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+    def _finished(self, event, failed: bool):
+        database, collection, query = self._pending.pop(
+            (event.request_id, event.connection_id), ("-", "-", None)
+        )
+        duration = event.duration_micros / 1_000_000
+        DB_QUERY_LATENCY.labels(operation=event.command_name, collection=collection).observe(duration)
+        if failed:
+            DB_QUERY_ERRORS.labels(operation=event.command_name, collection=collection).inc()
+
+        stats = request_db_stats.get()
+        if stats is not None:
+            size = len(bson.encode(event.reply)) if self.count_reply_bytes and not failed else 0
+            stats.record(duration, size)
+
+        if duration >= self.slow_query_seconds:
+            logger.warning(
+                f"Slow query: {event.command_name} on {collection} took {duration * 1000:.1f}ms",
+                extra={
+                    "extra_fields": {
+                        "slow_query": {
+                            "database": database,
+                            "collection": collection,
+                            "operation": event.command_name,
+                            "filter_shape": filter_shape(query) if query is not None else None,
+                            "duration_ms": round(duration * 1000, 3),
+                            "failed": failed
+                        }
+                    }
+                }
+            )
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Tracks pool size, connections in use and checkout wait time"""
+
+    def __init__(self):
+        # Checkouts happen on the executor thread that runs the operation
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def _checkout_finished(self):
+        started = getattr(self._local, "checkout_started", None)
+        if started is not None:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+            self._local.checkout_started = None
+
+    def connection_checked_out(self, event):
+        self._checkout_finished()
+        DB_CONNECTIONS_IN_USE.inc()
+
+    def connection_check_out_failed(self, event):
+        self._checkout_finished()
+
+    def connection_checked_in(self, event):
+        DB_CONNECTIONS_IN_USE.dec()
+
+    def connection_created(self, event):
+        DB_CONNECTION_POOL.inc()
+
+    def connection_closed(self, event):
+        DB_CONNECTION_POOL.dec()
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+command_listener = CommandMetricsListener(settings.DB_SLOW_QUERY_MS, settings.DB_COUNT_REPLY_BYTES)
+pool_listener = PoolMetricsListener()
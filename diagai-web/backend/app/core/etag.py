@@ -0,0 +1,34 @@
+import hashlib
+from typing import Any, Optional
+from fastapi import Request, Response
+from app.core.responses import dumps
+
+# Clients may keep a copy but must revalidate it before every use
+CACHE_CONTROL = "private, no-cache"
+
+def etag_for(*version: Any) -> str:
+    """Weak ETag for a resource version, e.g. a counter or a max updated_at"""
+    return f'W/"{hashlib.sha1(dumps(version)).hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+def conditional(request: Request, response: Response, *version: Any) -> Optional[Response]:
+    """Tag the response with an ETag for `version`.
+
+    Returns a 304 response when the client already holds that version, so the
+    endpoint can return it before building the body. The path and query are
+    part of the tag, so each page of a listing is tagged separately.
+    """
+    etag = etag_for(request.url.path, request.url.query, *version)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,154 @@
+# Declarative index registry: every index the application relies on is
+# declared here next to the query shapes it serves. Sync by hand with:
+#
+#     python -m app.core.indexes [--dry-run] [--drop-unknown]
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from app.core.config import get_settings
+from app.core.logger import logger
+
+settings = get_settings()
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    options: Dict = field(default_factory=dict, hash=False, compare=False)
+    serves: str = ""
+
+def _index(collection: str, *keys: Tuple[str, int], serves: str = "", **options) -> IndexSpec:
+    return IndexSpec(collection, tuple(keys), options, serves)
+
+INDEXES: List[IndexSpec] = [
+    # users
+    _index("users", ("email", 1), unique=True,
+           serves="Google sign-in lookup by email"),
+    _index("users", ("email", 1), ("_id", 1),
+           serves="/admin/users sorted by email"),
+    _index("users", ("firebase_uid", 1), unique=True,
+           serves="/auth/google lookup by firebase_uid"),
+    _index("users", ("created_at", 1), ("_id", 1),
+           serves="/admin/users sorted by created_at"),
+    _index("users", ("credits", 1), ("_id", 1),
+           serves="/admin/users sorted by credits"),
+
+    # projects
+    _index("projects", ("user_id", 1), ("name", 1),
+           serves="project lookups by owner and name"),
+    _index("projects", ("user_id", 1), ("created_at", 1), ("_id", 1),
+           serves="GET /projects/ listing and per-user project counts"),
+    _index("projects", ("user_id", 1), ("updated_at", 1),
+           serves="GET /projects/ ETag version (latest updated_at)"),
+    _index("projects", ("created_at", 1), ("_id", 1),
+           serves="/admin/projects sorted by created_at"),
+    _index("projects", ("updated_at", 1), ("_id", 1),
+           serves="/admin/projects sorted by updated_at"),
+    _index("projects", ("name", 1), ("_id", 1),
+           serves="/admin/projects sorted by name"),
+
+    # diagrams
+    _index("diagrams", ("user_id", 1), ("project_id", 1),
+           serves="diagrams of a user within a project"),
+    _index("diagrams", ("user_id", 1), ("created_at", 1), ("_id", 1),
+           serves="/users/diagrams, daily usage and history by user and date"),
+    _index("diagrams", ("user_id", 1), ("status", 1), ("created_at", 1),
+           serves="completed-diagram counts and usage by user, status and date"),
+    _index("diagrams", ("project_id", 1), ("created_at", 1), ("_id", 1),
+           serves="project diagram listings and per-project counts"),
+    _index("diagrams", ("status", 1), ("created_at", 1), ("_id", 1),
+           serves="/admin/diagrams filtered by status, stats by status"),
+    _index("diagrams", ("status", 1), ("_id", 1),
+           serves="/admin/diagrams sorted by status"),
+    _index("diagrams", ("type", 1), ("_id", 1),
+           serves="/admin/diagrams sorted by type"),
+    _index("diagrams", ("type", 1), ("created_at", 1), ("_id", 1),
+           serves="/admin/diagrams filtered by type"),
+    _index("diagrams", ("status", 1), ("type", 1), ("_id", 1),
+           serves="/admin/diagrams filtered by status, sorted by type"),
+    _index("diagrams", ("type", 1), ("status", 1), ("_id", 1),
+           serves="/admin/diagrams filtered by type, sorted by status"),
+    _index("diagrams", ("created_at", 1), ("_id", 1),
+           serves="/admin/diagrams sorted by created_at, recent-activity stats"),
+
+    # outputs
+    _index("outputs", ("diagram_id", 1), ("created_at", -1),
+           serves="latest output per diagram on /admin/projects/{id}"),
+
+    # user_invalidations
+    _index("user_invalidations", ("at", 1), expireAfterSeconds=300,
+           serves="user cache invalidation polls; expires entries long after every worker saw them"),
+
+    # usage_daily
+    _index("usage_daily", ("user_id", 1), ("day", 1), ("type", 1), ("status", 1), unique=True,
+           serves="rollup upserts, /users/credits/usage and /metrics/history range reads"),
+]
+
+def _normalize(keys) -> Tuple[Tuple[str, int], ...]:
+    return tuple((name, int(direction)) for name, direction in keys)
+
+async def sync_indexes(
+    database: AsyncIOMotorDatabase,
+    drop_unknown: bool = False,
+    dry_run: bool = False
+) -> Dict[str, List[str]]:
+    """Create missing declared indexes; optionally drop undeclared ones.
+
+    Idempotent: indexes that already exist with the same keys are left alone.
+    """
+    report: Dict[str, List[str]] = {"created": [], "dropped": [], "unchanged": [], "conflicts": []}
+    declared: Dict[str, Dict[Tuple, IndexSpec]] = {}
+    for spec in INDEXES:
+        declared.setdefault(spec.collection, {})[spec.keys] = spec
+
+    for collection, specs in declared.items():
+        existing = await database[collection].index_information()
+        existing_by_keys = {_normalize(info["key"]): (name, info) for name, info in existing.items()}
+
+        for keys, spec in specs.items():
+            label = f"{collection}{list(keys)}"
+            if keys in existing_by_keys:
+                _, info = existing_by_keys[keys]
+                if bool(info.get("unique")) != bool(spec.options.get("unique")):
+                    report["conflicts"].append(label)
+                else:
+                    report["unchanged"].append(label)
+                continue
+            if not dry_run:
+                await database[collection].create_index(list(keys), **spec.options)
+            report["created"].append(label)
+
+        if drop_unknown:
+            for keys, (name, _) in existing_by_keys.items():
+                if name == "_id_" or keys in specs:
+                    continue
+                if not dry_run:
+                    await database[collection].drop_index(name)
+                report["dropped"].append(f"{collection}.{name}")
+
+    if report["conflicts"]:
+        logger.warning(f"Indexes with conflicting options, left untouched: {report['conflicts']}")
+    return report
+
+async def _main(args) -> None:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    try:
+        report = await sync_indexes(
+            client.get_database("diagai_db"),
+            drop_unknown=args.drop_unknown,
+            dry_run=args.dry_run
+        )
+        for action in ("created", "dropped", "conflicts"):
+            for label in report[action]:
+                print(f"{action}: {label}")
+        print(f"unchanged: {len(report['unchanged'])}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync MongoDB indexes with the registry")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without applying them")
+    parser.add_argument("--drop-unknown", action="store_true", help="drop indexes that are not declared")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,65 @@
+import os
+import socket
+import uuid
+from pymongo.errors import DuplicateKeyError
+from app.core.database import db
+from app.core.logger import logger
+
+# Process-wide identity used as the owner of every lease this worker holds
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class MongoLease:
+    """Expiring lock stored in the `leases` collection.
+
+    Expiry is computed with the server clock (`$$NOW`), so workers on hosts
+    with skewed clocks agree on when a lease has lapsed. A holder that crashes
+    simply stops renewing and the lease becomes available after `ttl` seconds.
+    """
+
+    def __init__(self, name: str, ttl: int, owner: str = WORKER_ID):
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; returns False if another worker holds it."""
+        try:
+            await db.get_db().leases.find_one_and_update(
+                {
+                    "_id": self.name,
+                    "$or": [
+                        {"owner": self.owner},
+                        {"$expr": {"$lt": ["$expires_at", "$$NOW"]}}
+                    ]
+                },
+                [
+                    {
+                        "$set": {
+                            "owner": self.owner,
+                            "acquired_at": {
+                                "$cond": [
+                                    {"$eq": ["$owner", self.owner]},
+                                    "$acquired_at",
+                                    "$$NOW"
+                                ]
+                            },
+                            "expires_at": {"$add": ["$$NOW", self.ttl * 1000]}
+                        }
+                    }
+                ],
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The lease exists and is held by someone else
+            return False
+        except Exception as e:
+            logger.error(f"Failed to acquire lease {self.name}: {str(e)}")
+            return False
+
+    async def release(self) -> None:
+        """Give the lease up early if this worker still holds it."""
+        try:
+            await db.get_db().leases.delete_one({"_id": self.name, "owner": self.owner})
+        except Exception as e:
+            logger.error(f"Failed to release lease {self.name}: {str(e)}")
@@ -1,11 +1,43 @@
+import atexit
 import logging
+import queue
 import sys
 from datetime import datetime
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
-import json
-from typing import Any, Dict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl
+import orjson
 import traceback
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# Headers whose values never reach the logs; they are only noted as present
+REDACTED_HEADERS = frozenset({"authorization", "cookie", "set-cookie", "x-api-key", "x-metrics-token"})
+LOGGED_HEADERS = frozenset(header.lower() for header in settings.LOG_HEADERS) - REDACTED_HEADERS
+
+def loggable_headers(raw_headers: Iterable[Tuple[bytes, bytes]]) -> Dict[str, str]:
+    """Allow-listed headers from raw ASGI headers, with credentials redacted"""
+    headers: Dict[str, str] = {}
+    for raw_name, raw_value in raw_headers:
+        name = raw_name.decode("latin-1").lower()
+        if name in REDACTED_HEADERS:
+            headers[name] = "[REDACTED]"
+        elif name in LOGGED_HEADERS:
+            headers[name] = raw_value.decode("latin-1")
+    return headers
+
+LOGGED_QUERY_PARAMS = frozenset(settings.LOG_QUERY_PARAMS)
+
+def loggable_query(query_string: bytes) -> Optional[Dict[str, str]]:
+    """Allow-listed query parameters; others (search terms, tokens, emails) are redacted"""
+    if not query_string:
+        return None
+    params: Dict[str, str] = {}
+    for name, value in parse_qsl(query_string.decode("latin-1"), keep_blank_values=True):
+        params[name] = value if name in LOGGED_QUERY_PARAMS else "[REDACTED]"
+    return params
 
 class CustomJSONFormatter(logging.Formatter):
     def __init__(self):
@@ -13,8 +45,9 @@ class CustomJSONFormatter(logging.Formatter):
     
     def format(self, record: logging.LogRecord) -> str:
         log_data: Dict[str, Any] = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcfromtimestamp(record.created).isoformat(),
             "level": record.levelname,
+            "logger": record.name,
             "message": record.getMessage(),
             "module": record.module,
             "function": record.funcName,
@@ -33,45 +66,74 @@ class CustomJSONFormatter(logging.Formatter):
         if hasattr(record, "extra_fields"):
             log_data.update(record.extra_fields)
         
-        return json.dumps(log_data)
+        return orjson.dumps(log_data, default=str).decode()
+
+class NonBlockingHandler(QueueHandler):
+    """Hands records to the writer thread, so the caller only pays for a queue put"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now, while its arguments are current; formatting
+        # and I/O happen on the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+_listener: Optional[QueueListener] = None
 
 def setup_logging(
-    log_file: str = "logs/app.log",
-    level: int = logging.INFO,
-    max_size: int = 10 * 1024 * 1024,  # 10MB
-    backup_count: int = 5
+    log_file: str = settings.LOG_FILE,
+    level: str = settings.LOG_LEVEL,
+    max_size: int = settings.LOG_MAX_BYTES,
+    backup_count: int = settings.LOG_BACKUP_COUNT
 ) -> logging.Logger:
-    """Setup logging configuration"""
+    """Route every logger through one queue to a background writer thread.
+
+    The writer sends JSON lines to a rotating file and to stdout (JSON or
+    plain text, per LOG_FORMAT). Loggers only need to propagate to the root.
+    """
+    global _listener
+    if _listener is not None:
+        return logging.getLogger("diagai")
     
     # Create logs directory if it doesn't exist
     log_path = Path(log_file).parent
     log_path.mkdir(parents=True, exist_ok=True)
     
-    # Create logger
-    logger = logging.getLogger("diagai")
-    logger.setLevel(level)
-    
     # Create formatters
     json_formatter = CustomJSONFormatter()
-    console_formatter = logging.Formatter(
+    console_formatter = json_formatter if settings.LOG_FORMAT == "json" else logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
     
     # Create console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
     
     # Create file handler
     file_handler = RotatingFileHandler(
         log_file,
         maxBytes=max_size,
-        backupCount=backup_count
+        backupCount=backup_count,
+        delay=True
     )
     file_handler.setFormatter(json_formatter)
-    logger.addHandler(file_handler)
     
-    return logger
+    # Only the queue handler runs on the caller's thread
+    _listener = QueueListener(queue.SimpleQueue(), console_handler, file_handler, respect_handler_level=True)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers = [NonBlockingHandler(_listener.queue)]
+    _listener.start()
+    atexit.register(stop_logging)
+    
+    return logging.getLogger("diagai")
+
+def stop_logging() -> None:
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 # Create logger instance
 logger = setup_logging()
@@ -83,7 +145,7 @@ def log_request(request, response=None, error=None):
             "request": {
                 "method": request.method,
                 "url": str(request.url),
-                "headers": dict(request.headers),
+                "headers": loggable_headers(request.headers.raw),
                 "client_ip": request.client.host
             }
         }
@@ -92,7 +154,7 @@ def log_request(request, response=None, error=None):
     if response:
         log_data["extra_fields"]["response"] = {
             "status_code": response.status_code,
-            "headers": dict(response.headers)
+            "headers": loggable_headers(response.headers.raw)
         }
     
     if error:
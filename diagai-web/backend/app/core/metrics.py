@@ -1,9 +1,15 @@
 from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, generate_latest
+from starlette.routing import Match
+from starlette.types import Scope
+import asyncio
 import time
-from typing import Optional
+from typing import Optional, Set
 from functools import wraps
+from app.core.config import get_settings
 from app.core.logger import logger
 
+settings = get_settings()
+
 # Create registry
 REGISTRY = CollectorRegistry(auto_describe=True)
 
@@ -11,14 +17,20 @@ REGISTRY = CollectorRegistry(auto_describe=True)
 REQUEST_COUNT = Counter(
     'http_requests_total',
     'Total number of HTTP requests',
-    ['method', 'endpoint', 'status'],
+    ['method', 'route', 'status'],
     registry=REGISTRY
 )
 
 REQUEST_LATENCY = Histogram(
     'http_request_duration_seconds',
     'HTTP request latency in seconds',
-    ['method', 'endpoint'],
+    ['method', 'route'],
+    registry=REGISTRY
+)
+
+ROUTES_COLLAPSED = Counter(
+    'http_route_labels_collapsed_total',
+    'Requests labelled <other> because METRICS_MAX_ROUTES distinct routes were already labelled',
     registry=REGISTRY
 )
 
@@ -36,6 +48,49 @@ DB_CONNECTION_POOL = Gauge(
     registry=REGISTRY
 )
 
+DB_CONNECTIONS_IN_USE = Gauge(
+    'db_connections_in_use',
+    'Database connections currently checked out of the pool',
+    registry=REGISTRY
+)
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds',
+    'Time spent waiting to check a connection out of the pool',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+    registry=REGISTRY
+)
+
+DB_QUERY_ERRORS = Counter(
+    'db_query_errors_total',
+    'Database commands that failed',
+    ['operation', 'collection'],
+    registry=REGISTRY
+)
+
+DB_COMMANDS_PER_REQUEST = Histogram(
+    'db_commands_per_request',
+    'Database commands issued while serving one request',
+    ['method', 'route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+    registry=REGISTRY
+)
+
+DB_TIME_PER_REQUEST = Histogram(
+    'db_time_per_request_seconds',
+    'Total database command time while serving one request',
+    ['method', 'route'],
+    registry=REGISTRY
+)
+
+DB_BYTES_PER_REQUEST = Histogram(
+    'db_bytes_per_request',
+    'Bytes of database replies received while serving one request',
+    ['method', 'route'],
+    buckets=(0, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+    registry=REGISTRY
+)
+
 # Cache metrics
 CACHE_HITS = Counter(
     'cache_hits_total',
@@ -51,6 +106,104 @@ CACHE_MISSES = Counter(
     registry=REGISTRY
 )
 
+USER_LOOKUPS_SAVED = Counter(
+    'user_lookup_db_reads_saved_total',
+    'User lookups served without a database read',
+    ['source'],
+    registry=REGISTRY
+)
+
+# Conditional request metrics
+CONDITIONAL_REQUESTS = Counter(
+    'http_conditional_requests_total',
+    'ETagged responses, by whether the full body was sent or a 304',
+    ['route', 'result'],
+    registry=REGISTRY
+)
+
+CONDITIONAL_REQUEST_DURATION = Histogram(
+    'http_conditional_request_duration_seconds',
+    'Server time of ETagged responses, by whether the full body was sent or a 304',
+    ['route', 'result'],
+    registry=REGISTRY
+)
+
+NOT_MODIFIED_BYTES_SAVED = Counter(
+    'http_not_modified_bytes_saved_total',
+    'Response body bytes not sent because the client copy was current',
+    ['route'],
+    registry=REGISTRY
+)
+
+# Compression metrics
+COMPRESSION_BYTES = Counter(
+    'http_response_compression_bytes_total',
+    'Compressed response body bytes before (original) and after (compressed) compression',
+    ['route', 'encoding', 'stage'],
+    registry=REGISTRY
+)
+
+COMPRESSION_RATIO = Histogram(
+    'http_response_compression_ratio',
+    'Compressed size as a fraction of the original size, per response',
+    ['route', 'encoding'],
+    buckets=(0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.7, 0.9, 1.0),
+    registry=REGISTRY
+)
+
+COMPRESSION_CPU_SECONDS = Histogram(
+    'http_response_compression_cpu_seconds',
+    'CPU time spent compressing a response',
+    ['route', 'encoding'],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+    registry=REGISTRY
+)
+
+# Event loop metrics
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'Delay between a scheduled event loop wake-up and when it actually ran',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    registry=REGISTRY
+)
+
+# Auth metrics
+FIREBASE_VERIFY_LATENCY = Histogram(
+    'firebase_verify_duration_seconds',
+    'Firebase ID token verification latency in seconds (off the event loop)',
+    ['stage'],
+    registry=REGISTRY
+)
+
+# Scheduler metrics
+SCHEDULER_IS_LEADER = Gauge(
+    'scheduler_is_leader',
+    'Whether this worker holds the scheduler leader lease',
+    registry=REGISTRY
+)
+
+SCHEDULER_JOB_DURATION = Histogram(
+    'scheduler_job_duration_seconds',
+    'Scheduled job run duration in seconds',
+    ['job'],
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 1800, 3600, 7200),
+    registry=REGISTRY
+)
+
+SCHEDULER_JOB_LAST_SUCCESS = Gauge(
+    'scheduler_job_last_success_timestamp_seconds',
+    'Unix time of the last successful run of a scheduled job',
+    ['job'],
+    registry=REGISTRY
+)
+
+SCHEDULER_JOB_SKIPPED = Counter(
+    'scheduler_job_skipped_total',
+    'Scheduled job runs skipped on this worker',
+    ['job', 'reason'],
+    registry=REGISTRY
+)
+
 # Business metrics
 DIAGRAM_GENERATION_COUNT = Counter(
     'diagram_generation_total',
@@ -66,42 +219,60 @@ DIAGRAM_GENERATION_LATENCY = Histogram(
     registry=REGISTRY
 )
 
-USER_CREDITS = Gauge(
-    'user_credits',
-    'Current user credits',
-    ['user_id'],
-    registry=REGISTRY
-)
-
-class MetricsMiddleware:
-    async def __call__(self, request, call_next):
-        start_time = time.time()
-        
-        try:
-            response = await call_next(request)
-            
-            # Record request metrics
-            REQUEST_COUNT.labels(
-                method=request.method,
-                endpoint=request.url.path,
-                status=response.status_code
-            ).inc()
-            
-            REQUEST_LATENCY.labels(
-                method=request.method,
-                endpoint=request.url.path
-            ).observe(time.time() - start_time)
-            
-            return response
-            
-        except Exception as e:
-            # Record failed request
-            REQUEST_COUNT.labels(
-                method=request.method,
-                endpoint=request.url.path,
-                status=500
-            ).inc()
-            raise
+DIAGRAM_WRITES = Histogram(
+    'diagram_db_writes',
+    'Database writes per diagram, from the generate request to its final status',
+    ['status'],
+    buckets=(1, 2, 3, 4, 5, 6, 7, 8, 10, 15),
+    registry=REGISTRY
+)
+
+# User metrics, aggregated over all users by the admin stats snapshot
+USERS_BY_CREDIT_BALANCE = Gauge(
+    'users_by_credit_balance',
+    'Number of users per credit balance range',
+    ['range'],
+    registry=REGISTRY
+)
+
+USER_CREDITS_OUTSTANDING = Gauge(
+    'user_credits_outstanding',
+    'Credits held across all users',
+    registry=REGISTRY
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+OTHER_ROUTE = "<other>"
+
+_labelled_routes: Set[str] = set()
+
+def _match_route(scope: Scope) -> str:
+    if "app_root_path" in scope:
+        # A Mount has handled the request and moved its prefix from path to root_path
+        prefix = scope["root_path"][len(scope["app_root_path"]):]
+        scope = {**scope, "path": prefix + scope["path"], "root_path": scope["app_root_path"]}
+    router = getattr(scope.get("app"), "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path_format
+    return UNMATCHED_ROUTE
+
+def route_template(scope: Scope) -> str:
+    """Bounded route label for a request, e.g. /api/v1/projects/{project_id}.
+
+    API routes record themselves in the scope; other routes (docs, the
+    /storage mount) are matched here, and paths no route knows share one
+    label. Past METRICS_MAX_ROUTES distinct labels, new ones become <other>.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or _match_route(scope)
+    if template not in _labelled_routes:
+        if len(_labelled_routes) >= settings.METRICS_MAX_ROUTES:
+            ROUTES_COLLAPSED.inc()
+            return OTHER_ROUTE
+        _labelled_routes.add(template)
+    return template
 
 def track_db_query(operation: str, collection: str):
     """Decorator to track database query metrics"""
@@ -165,9 +336,13 @@ def track_diagram_generation(diagram_type: str):
         return wrapper
     return decorator
 
-def update_user_credits(user_id: str, credits: float):
-    """Update user credits metric"""
-    USER_CREDITS.labels(user_id=user_id).set(credits)
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Record how late the event loop wakes up; blocking calls show up as lag"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
 
 def get_metrics():
     """Get current metrics in Prometheus format"""
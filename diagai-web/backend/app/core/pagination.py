@@ -0,0 +1,145 @@
+import base64
+import binascii
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from bson import json_util
+from fastapi import HTTPException, status
+from app.core.cache import cache
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# Sort fields each listing accepts. Every entry is backed by a
+# (field, _id) index in app.core.indexes so keyset pages never sort in memory.
+SORTABLE_FIELDS = {
+    "users": ["created_at", "email", "credits"],
+    "diagrams": ["created_at", "status", "type"],
+    "projects": ["created_at", "updated_at", "name"]
+}
+
+def validate_sort(collection: str, sort_by: Optional[str], default: str = "created_at") -> str:
+    """Return the sort field, rejecting fields that have no supporting index"""
+    sort_by = sort_by or default
+    if sort_by not in SORTABLE_FIELDS[collection]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported sort field. Must be one of: {SORTABLE_FIELDS[collection]}"
+        )
+    return sort_by
+
+def encode_cursor(sort_by: str, sort_order: str, document: dict) -> str:
+    """Opaque cursor pointing just after `document` in (sort_by, _id) order"""
+    payload = json_util.dumps({
+        "f": sort_by,
+        "o": sort_order,
+        "v": document.get(sort_by),
+        "id": document["_id"]
+    })
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str) -> Tuple[Any, Any]:
+    """Decode a cursor into the (sort value, _id) of the last row already seen"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if payload["f"] != sort_by or payload["o"] != sort_order:
+            raise ValueError("cursor was issued for a different sort")
+        return payload["v"], payload["id"]
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid cursor: {str(e)}"
+        )
+
+def keyset_filter(sort_by: str, direction: int, value: Any, last_id: Any) -> dict:
+    """Filter for rows strictly after (value, last_id) in the given direction.
+
+    MongoDB orders null/missing values before everything else, so they come
+    last in descending order and first in ascending order.
+    """
+    op = "$lt" if direction == -1 else "$gt"
+    if value is None:
+        after_ties = {sort_by: None, "_id": {op: last_id}}
+        if direction == -1:
+            return after_ties
+        return {"$or": [after_ties, {sort_by: {"$ne": None}}]}
+
+    clauses: List[dict] = [
+        {sort_by: {op: value}},
+        {sort_by: value, "_id": {op: last_id}}
+    ]
+    if direction == -1:
+        clauses.append({sort_by: None})
+    return {"$or": clauses}
+
+def keyset_cursor(
+    collection,
+    query: dict,
+    sort_by: str,
+    sort_order: str,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None
+):
+    """Motor cursor over `query` in (sort_by, _id) order, starting after `cursor`"""
+    direction = -1 if sort_order.lower() == "desc" else 1
+    if projection is not None:
+        # The cursor is built from the sort field, so it must be fetched
+        projection = {**projection, sort_by: 1}
+    find_query = query
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_by, sort_order)
+        after = keyset_filter(sort_by, direction, value, last_id)
+        find_query = {"$and": [query, after]} if query else after
+
+    return collection.find(find_query, projection) \
+        .sort([(sort_by, direction), ("_id", direction)])
+
+async def keyset_page(
+    collection,
+    query: dict,
+    sort_by: str,
+    sort_order: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    page: int = 1,
+    projection: Optional[dict] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Fetch one page ordered by (sort_by, _id) and the cursor for the next one.
+
+    With a cursor the page starts right after it using the index. Without one,
+    `page` falls back to an offset for clients that still paginate by number,
+    up to PAGINATION_MAX_OFFSET rows; past that the cursor is required.
+    """
+    find = keyset_cursor(collection, query, sort_by, sort_order, cursor, projection)
+    if not cursor and page > 1:
+        offset = (page - 1) * limit
+        if offset > settings.PAGINATION_MAX_OFFSET:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"page can only reach the first {settings.PAGINATION_MAX_OFFSET} rows; "
+                       "continue with cursor=<next_cursor of the previous page>"
+            )
+        find = find.skip(offset)
+    documents = await find.limit(limit + 1).to_list(length=None)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(sort_by, sort_order, documents[-1])
+    return documents, next_cursor
+
+async def cached_count(collection, query: dict) -> int:
+    """Total for a listing: metadata estimate when unfiltered, else a short-lived cached count"""
+    if not query:
+        return await collection.estimated_document_count()
+
+    digest = hashlib.sha256(
+        json.dumps(json.loads(json_util.dumps(query)), sort_keys=True).encode()
+    ).hexdigest()
+    key = f"count:{collection.name}:{digest}"
+    total = await cache.l1.get(key)
+    if total is None:
+        total = await collection.count_documents(query)
+        await cache.l1.set(key, total, expire=settings.PAGINATION_COUNT_TTL)
+    return total
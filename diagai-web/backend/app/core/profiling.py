@@ -0,0 +1,102 @@
+import importlib.abc
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a module loader and records how long executing the module took"""
+
+    def __init__(self, loader, profiler: "StartupProfiler"):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler.imports[module.__name__] = time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """Meta path finder that delegates to the real finders and times the loaders"""
+
+    def __init__(self, profiler: "StartupProfiler"):
+        self._profiler = profiler
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self._profiler)
+                return spec
+        return None
+
+class StartupProfiler:
+    """Collects per-module import times and startup phase timings"""
+
+    def __init__(self):
+        self.created_at = time.perf_counter()
+        self.imports: Dict[str, float] = {}
+        self.phases: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+        self._finder: Optional[_TimingFinder] = None
+
+    def install_import_hook(self) -> None:
+        """Start timing imports; only modules imported after this are measured"""
+        if self._finder is None:
+            self._finder = _TimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def remove_import_hook(self) -> None:
+        """Stop timing imports"""
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+
+    def elapsed(self) -> float:
+        """Seconds since the profiler was created"""
+        return time.perf_counter() - self.created_at
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a named startup phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def mark_ready(self) -> None:
+        """Record the moment the worker can serve requests"""
+        self.ready_at = time.perf_counter()
+        self.remove_import_hook()
+
+    def report(self, top: int = 25) -> dict:
+        """Startup report: slowest imports (inclusive of their own imports) and phase timings"""
+        slowest: List[dict] = [
+            {"module": name, "seconds": round(seconds, 6)}
+            for name, seconds in sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:top]
+        ]
+        return {
+            "imports_profiled": bool(self.imports),
+            "modules_imported": len(self.imports),
+            "slowest_imports": slowest,
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            "ready_after_seconds": round(self.ready_at - self.created_at, 6) if self.ready_at else None
+        }
+
+# Create profiler instance; import timing is opt-in because it wraps every loader
+startup_profiler = StartupProfiler()
+if os.getenv("PROFILE_IMPORTS", "").lower() in ("1", "true", "yes"):
+    startup_profiler.install_import_hook()
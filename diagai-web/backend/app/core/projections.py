@@ -0,0 +1,54 @@
+from typing import Dict, Iterable, Optional, Tuple
+from fastapi import HTTPException, status
+
+# Named field sets for list endpoints. "summary" is what the list views render
+# (without a diagram's prompt, the bulkiest field); "full" returns whole
+# documents and stays the default of the diagram listings, which already
+# returned them. Projections are applied in the query, so the
+# fields left out are never sent by MongoDB nor decoded by the driver.
+VIEWS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "diagrams": {
+        "summary": (
+            "user_id", "project_id", "title", "type", "status",
+            "url", "thumbnail_url", "credits_used", "created_at", "updated_at"
+        )
+    },
+    "projects": {
+        "summary": (
+            "user_id", "name", "description", "status", "shared", "starred",
+            "diagrams", "created_at", "updated_at"
+        )
+    }
+}
+
+# Fields a client may ask for with `fields=`
+SELECTABLE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "diagrams": VIEWS["diagrams"]["summary"] + ("prompt", "diagramType", "frames", "error"),
+    "projects": VIEWS["projects"]["summary"]
+}
+
+def resolve_projection(
+    collection: str,
+    view: str = "summary",
+    fields: Optional[str] = None,
+    required: Iterable[str] = ()
+) -> Optional[dict]:
+    """Projection for a list query, or None for whole documents.
+
+    `fields` is a comma-separated sparse fieldset and takes precedence over
+    `view`. `required` lists fields the endpoint itself needs (e.g. for joins).
+    """
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = sorted(set(requested) - set(SELECTABLE_FIELDS[collection]) - {"_id"})
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {unknown}. Must be among: {list(SELECTABLE_FIELDS[collection])}"
+            )
+    elif view == "full":
+        return None
+    else:
+        requested = list(VIEWS[collection][view])
+
+    return {field: 1 for field in (*requested, *required)}
@@ -0,0 +1,73 @@
+import asyncio
+import functools
+from typing import Any, Callable, Dict, List, Optional
+import orjson
+from bson import ObjectId
+from fastapi import Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.dependencies.utils import get_typed_return_annotation
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse as _ORJSONResponse
+from fastapi.routing import APIRoute
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+# Response models that only describe "a document" or "a list of documents".
+# Validating against them adds nothing, so such routes are encoded directly.
+RAW_RESPONSE_MODELS = (None, dict, list, List[dict], Dict[str, Any])
+
+def orjson_default(obj: Any) -> Any:
+    """Encode the types orjson does not know natively, as jsonable_encoder would"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    return jsonable_encoder(obj)
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=orjson_default, option=ORJSON_OPTIONS)
+
+class ORJSONResponse(_ORJSONResponse):
+    """JSON response encoded with orjson; datetimes, ObjectIds and nested documents included"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def _returns_documents(endpoint: Callable, response_model: Any) -> bool:
+    if isinstance(response_model, DefaultPlaceholder):
+        response_model = get_typed_return_annotation(endpoint)
+    return response_model in RAW_RESPONSE_MODELS
+
+def _encode_documents(endpoint: Callable, status_code: Optional[int] = None) -> Callable:
+    """Wrap an endpoint so its result is rendered straight to an ORJSONResponse.
+
+    FastAPI would otherwise walk every document through jsonable_encoder or the
+    response model before the response class ever sees it. Headers and status
+    set on an injected `Response` parameter are carried over as FastAPI does.
+    """
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        content = await endpoint(*args, **kwargs)
+        if isinstance(content, Response):
+            return content
+
+        sub_response = next((value for value in kwargs.values() if isinstance(value, Response)), None)
+        code = (sub_response and sub_response.status_code) or status_code or 200
+        response = ORJSONResponse(content, status_code=code)
+        if sub_response is not None:
+            response.headers.raw.extend(sub_response.headers.raw)
+        return response
+
+    wrapper.encodes_documents = True
+    return wrapper
+
+class ORJSONRoute(APIRoute):
+    """Route that encodes plain document responses with orjson, skipping validation"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        response_model = kwargs.get("response_model", DefaultPlaceholder(None))
+        if (
+            asyncio.iscoroutinefunction(endpoint)
+            and not getattr(endpoint, "encodes_documents", False)
+            and _returns_documents(endpoint, response_model)
+        ):
+            endpoint = _encode_documents(endpoint, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
@@ -1,47 +1,184 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from app.services.backup import BackupService
+from app.services.admin_stats import admin_stats
+from app.services.counters import recompute_user_counters
+from app.core.database import db
+from app.core.config import get_settings
+from app.core.lease import MongoLease
 from app.core.logger import logger
+from app.core.metrics import (
+    SCHEDULER_IS_LEADER,
+    SCHEDULER_JOB_DURATION,
+    SCHEDULER_JOB_LAST_SUCCESS,
+    SCHEDULER_JOB_SKIPPED
+)
+from app.core.security import refresh_google_certs_async
 from datetime import datetime
+from typing import Awaitable, Callable
+import time
+
+settings = get_settings()
 
 class Scheduler:
+    """APScheduler wrapper that runs cluster jobs on one elected worker.
+
+    Every worker runs the scheduler, but only the worker holding the
+    `scheduler-leader` lease executes jobs added with `add_cluster_job`. Each
+    cluster job additionally takes its own lease for the duration of the run,
+    so a run that outlives a leadership change is never started twice. Jobs
+    added with `add_local_job` (e.g. per-process cache warming) run everywhere.
+    """
+
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
         self.backup_service = BackupService()
-    
+        self.leader_lease = MongoLease("scheduler-leader", ttl=settings.SCHEDULER_LEASE_TTL)
+        self.is_leader = False
+
     async def backup_job(self):
         """Daily backup job"""
+        logger.info("Starting daily backup")
+        await self.backup_service.create_backup()
+        await self.backup_service.cleanup_old_backups(keep_days=7)
+        logger.info("Daily backup completed")
+
+    async def counters_repair_job(self):
+        """Recompute per-user counters to repair any drift"""
+        await recompute_user_counters(db.get_db())
+
+    async def admin_stats_job(self):
+        """Refresh the admin dashboard stats snapshot"""
+        await admin_stats.refresh(db.get_db())
+
+    async def firebase_certs_job(self):
+        """Keep Google's ID token certificates warm in this worker"""
+        await refresh_google_certs_async()
+
+    async def leadership_job(self):
+        """Take or renew the leader lease"""
+        is_leader = await self.leader_lease.acquire()
+        if is_leader != self.is_leader:
+            logger.info(f"Scheduler leadership {'acquired' if is_leader else 'lost'}")
+        self.is_leader = is_leader
+        SCHEDULER_IS_LEADER.set(1 if is_leader else 0)
+
+    async def _run_job(self, name: str, func: Callable[[], Awaitable[None]]):
+        start_time = time.time()
         try:
-            logger.info("Starting daily backup")
-            await self.backup_service.create_backup()
-            await self.backup_service.cleanup_old_backups(keep_days=7)
-            logger.info("Daily backup completed")
+            await func()
+            SCHEDULER_JOB_LAST_SUCCESS.labels(job=name).set_to_current_time()
         except Exception as e:
-            logger.error(f"Daily backup failed: {str(e)}", exc_info=True)
-    
+            logger.error(f"Scheduled job {name} failed: {str(e)}", exc_info=True)
+        finally:
+            SCHEDULER_JOB_DURATION.labels(job=name).observe(time.time() - start_time)
+
+    async def _run_cluster_job(self, name: str, func: Callable[[], Awaitable[None]], max_runtime: int):
+        if not self.is_leader:
+            SCHEDULER_JOB_SKIPPED.labels(job=name, reason="not_leader").inc()
+            return
+
+        job_lease = MongoLease(f"job:{name}", ttl=max_runtime)
+        if not await job_lease.acquire():
+            SCHEDULER_JOB_SKIPPED.labels(job=name, reason="overlap").inc()
+            logger.warning(f"Skipping job {name}: previous run still holds its lease")
+            return
+
+        try:
+            await self._run_job(name, func)
+        finally:
+            await job_lease.release()
+
+    def add_cluster_job(self, name: str, func: Callable[[], Awaitable[None]], trigger, max_runtime: int = 3600):
+        """Schedule a job that must run once per cluster; max_runtime bounds its lease"""
+        self.scheduler.add_job(
+            self._run_cluster_job,
+            trigger,
+            args=[name, func, max_runtime],
+            id=name,
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+
+    def add_local_job(self, name: str, func: Callable[[], Awaitable[None]], trigger, **kwargs):
+        """Schedule a job that runs in every worker"""
+        self.scheduler.add_job(
+            self._run_job,
+            trigger,
+            args=[name, func],
+            id=name,
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+            **kwargs
+        )
+
     def start(self):
         """Start the scheduler"""
         try:
-            # Add backup job (runs daily at 2 AM)
+            # Elect a leader now and keep renewing well within the lease TTL
             self.scheduler.add_job(
+                self.leadership_job,
+                IntervalTrigger(seconds=max(1, settings.SCHEDULER_LEASE_TTL // 3)),
+                id="scheduler-leadership",
+                max_instances=1,
+                next_run_time=datetime.now()
+            )
+
+            # Add backup job (runs daily at 2 AM)
+            self.add_cluster_job(
+                "backup",
                 self.backup_job,
-                CronTrigger(hour=2, minute=0)
+                CronTrigger(hour=2, minute=0),
+                max_runtime=6 * 3600
+            )
+
+            # Repair per-user counters (runs daily at 3 AM)
+            self.add_cluster_job(
+                "counters_repair",
+                self.counters_repair_job,
+                CronTrigger(hour=3, minute=0)
+            )
+
+            # Refresh the admin stats snapshot
+            self.add_cluster_job(
+                "admin_stats",
+                self.admin_stats_job,
+                IntervalTrigger(seconds=settings.ADMIN_STATS_REFRESH_INTERVAL),
+                max_runtime=settings.ADMIN_STATS_REFRESH_INTERVAL
             )
-            
+
+            # Refresh Google certificates now and periodically in each worker
+            self.add_local_job(
+                "firebase_certs",
+                self.firebase_certs_job,
+                IntervalTrigger(seconds=settings.FIREBASE_CERT_REFRESH_INTERVAL),
+                next_run_time=datetime.now()
+            )
+
             # Start the scheduler
             self.scheduler.start()
             logger.info("Scheduler started successfully")
-            
+
         except Exception as e:
             logger.error(f"Failed to start scheduler: {str(e)}", exc_info=True)
             raise
-    
+
+    async def release_leadership(self):
+        """Hand the leader lease back so another worker can take over immediately"""
+        if self.is_leader:
+            await self.leader_lease.release()
+            self.is_leader = False
+            SCHEDULER_IS_LEADER.set(0)
+
     def shutdown(self):
         """Shutdown the scheduler"""
         try:
             self.scheduler.shutdown()
             logger.info("Scheduler shutdown successfully")
-            
+
         except Exception as e:
             logger.error(f"Failed to shutdown scheduler: {str(e)}", exc_info=True)
             raise
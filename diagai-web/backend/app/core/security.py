@@ -4,15 +4,27 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from app.core.config import get_settings
+from app.core.metrics import FIREBASE_VERIFY_LATENCY
+from concurrent.futures import ThreadPoolExecutor
 import firebase_admin
 from firebase_admin import auth, credentials
+import asyncio
+import threading
+import time
 import os
 
 settings = get_settings()
 
-# Initialize Firebase Admin
-cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS)
-firebase_admin.initialize_app(cred)
+_firebase_init_lock = threading.Lock()
+
+def ensure_firebase_app() -> firebase_admin.App:
+    """Initialize Firebase Admin on first use instead of at import time"""
+    with _firebase_init_lock:
+        try:
+            return firebase_admin.get_app()
+        except ValueError:
+            cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS)
+            return firebase_admin.initialize_app(cred)
 
 # JWT settings
 SECRET_KEY = settings.SECRET_KEY
@@ -48,11 +60,74 @@ async def verify_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+# Firebase token verification does blocking HTTP (certificate fetch, user
+# lookup), so it runs on a small dedicated pool instead of the event loop.
+_firebase_executor = ThreadPoolExecutor(
+    max_workers=settings.FIREBASE_VERIFY_WORKERS,
+    thread_name_prefix="firebase-verify"
+)
+
+# uid -> (fetched_at, disabled, tokens_valid_after_timestamp in ms)
+_revocation_cache: dict = {}
+_revocation_lock = threading.Lock()
+
+def _check_revoked(decoded_token: dict) -> None:
+    """Revocation check equivalent to check_revoked=True, with a short per-uid cache"""
+    uid = decoded_token["uid"]
+    now = time.monotonic()
+    with _revocation_lock:
+        entry = _revocation_cache.get(uid)
+    if entry is None or now - entry[0] > settings.FIREBASE_REVOCATION_CACHE_TTL:
+        start = time.perf_counter()
+        user = auth.get_user(uid)
+        FIREBASE_VERIFY_LATENCY.labels(stage="revocation").observe(time.perf_counter() - start)
+        entry = (now, user.disabled, user.tokens_valid_after_timestamp or 0)
+        with _revocation_lock:
+            _revocation_cache[uid] = entry
+
+    _, disabled, tokens_valid_after = entry
+    if disabled:
+        raise auth.UserDisabledError("The user record is disabled.")
+    if decoded_token.get("iat", 0) * 1000 < tokens_valid_after:
+        raise auth.RevokedIdTokenError("The Firebase ID token has been revoked.")
+
+def _verify_id_token_sync(token: str) -> dict:
+    ensure_firebase_app()
+    start = time.perf_counter()
+    decoded_token = auth.verify_id_token(token)
+    FIREBASE_VERIFY_LATENCY.labels(stage="signature").observe(time.perf_counter() - start)
+    _check_revoked(decoded_token)
+    return decoded_token
+
+def refresh_google_certs() -> None:
+    """Fetch Google's ID token certificates so sign-ins hit a warm cache.
+
+    firebase_admin caches the certificates according to their Cache-Control
+    headers; requesting them through the same transport refreshes that cache.
+    """
+    from firebase_admin import _token_gen
+    ensure_firebase_app()
+    client = auth._get_client(None)
+    verifier = getattr(client, "_token_verifier", None)
+    if verifier is None:
+        return
+    start = time.perf_counter()
+    verifier.request(_token_gen.ID_TOKEN_CERT_URI)
+    FIREBASE_VERIFY_LATENCY.labels(stage="cert_refresh").observe(time.perf_counter() - start)
+
+async def refresh_google_certs_async() -> None:
+    """Refresh Google certificates on the Firebase verification pool"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_firebase_executor, refresh_google_certs)
+
 async def verify_google_token(token: str) -> dict:
     try:
-        # Verify the ID token while checking if the token is revoked by
-        # passing check_revoked=True
-        decoded_token = auth.verify_id_token(token, check_revoked=True)
+        # Verify the ID token and check whether it has been revoked, off the
+        # event loop
+        loop = asyncio.get_running_loop()
+        decoded_token = await loop.run_in_executor(
+            _firebase_executor, _verify_id_token_sync, token
+        )
         
         # Token is valid and not revoked
         return {
@@ -0,0 +1,28 @@
+from typing import AsyncIterator, Optional
+from fastapi.responses import StreamingResponse
+from app.core.responses import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Documents fetched per getMore while streaming; bounds memory per response
+STREAM_BATCH_SIZE = 200
+
+def ndjson_line(document: dict) -> bytes:
+    return dumps(document) + b"\n"
+
+async def _ndjson_rows(cursor, head: Optional[dict]) -> AsyncIterator[bytes]:
+    if head is not None:
+        yield ndjson_line(head)
+    async for document in cursor:
+        yield ndjson_line(document)
+
+def ndjson_response(cursor, head: Optional[dict] = None) -> StreamingResponse:
+    """Stream a Motor cursor as newline-delimited JSON, one document per line.
+
+    Rows are written as each batch arrives, so memory does not grow with the
+    size of the result. `head` (e.g. the parent project) is written first.
+    """
+    return StreamingResponse(
+        _ndjson_rows(cursor.batch_size(STREAM_BATCH_SIZE), head),
+        media_type=NDJSON_MEDIA_TYPE
+    )
@@ -0,0 +1,115 @@
+from typing import Any, Dict, Optional
+from datetime import datetime, timedelta
+import asyncio
+import time
+from fastapi import Request
+from app.core.cache import cache
+from app.core.config import get_settings
+from app.core.dataloader import request_loaders
+from app.core.db_monitoring import request_db_stats
+from app.core.logger import logger
+from app.core.metrics import USER_LOOKUPS_SAVED
+
+settings = get_settings()
+
+# Writers record every user invalidation in `user_invalidations`; each worker
+# polls it and drops the matching L1 copies. Polls look back a little before
+# the previous one so an invalidation committed late (or stamped by a worker
+# with a slightly behind clock) is still seen; ones already applied are skipped.
+INVALIDATION_LOOKBACK = timedelta(seconds=5)
+
+_invalidations_since = datetime.utcnow()
+_invalidations_seen: Dict[Any, datetime] = {}
+_invalidations_synced_at: Optional[float] = None
+
+def _user_cache_key(user_id: Any) -> str:
+    return f"user:{user_id}"
+
+def _count_saved_read(source: str) -> None:
+    USER_LOOKUPS_SAVED.labels(source=source).inc()
+    stats = request_db_stats.get()
+    if stats is not None:
+        stats.record_saved_read()
+
+def _invalidations_current() -> bool:
+    """Whether this worker polled the invalidations recently enough to trust its L1"""
+    if _invalidations_synced_at is None:
+        return False
+    max_age = 3 * settings.USER_INVALIDATION_POLL_INTERVAL
+    return time.monotonic() - _invalidations_synced_at <= max_age
+
+async def get_user(db, user_id: Any, request: Optional[Request] = None) -> Optional[dict]:
+    """Load a user by id through the request loader and the short-TTL user cache.
+
+    Cached copies are only served while this worker is polling the
+    invalidations, so a write on another worker reaches them within about
+    USER_INVALIDATION_POLL_INTERVAL seconds; otherwise every lookup reads
+    the database.
+    """
+    loader = request_loaders(request, db).users if request is not None else None
+    if loader is not None and loader.is_loaded(user_id):
+        _count_saved_read("request")
+        return await loader.load(user_id)
+
+    if _invalidations_current():
+        entry = await cache.l1.get(_user_cache_key(user_id))
+        if entry is not None:
+            _count_saved_read("cache")
+            user = dict(entry)
+            if loader is not None:
+                loader.prime(user_id, user)
+            return user
+
+    if loader is not None:
+        user = await loader.load(user_id)
+    else:
+        user = await db.users.find_one({"_id": user_id})
+    if user is not None:
+        await cache.l1.set(_user_cache_key(user_id), dict(user), expire=settings.USER_CACHE_TTL)
+    return user
+
+async def invalidate_user(db, user_id: Any, request: Optional[Request] = None) -> None:
+    """Drop a user from the user cache (and request loader) after a write to `users`.
+
+    Other workers drop their copies on their next invalidations poll.
+    """
+    await cache.l1.delete(_user_cache_key(user_id))
+    loaders = getattr(request.state, "loaders", None) if request is not None else None
+    if loaders is not None:
+        loaders.users.clear(user_id)
+    try:
+        await db.user_invalidations.insert_one({"user_id": user_id, "at": datetime.utcnow()})
+    except Exception as e:
+        # Other workers keep their copy until USER_CACHE_TTL expires it
+        logger.error(f"Error recording user invalidation: {str(e)}")
+
+async def sync_invalidations(db) -> int:
+    """Drop the L1 copies of users invalidated since the last poll; returns how many"""
+    global _invalidations_since, _invalidations_synced_at
+    polled_at = time.monotonic()
+    next_since = datetime.utcnow()
+    since = _invalidations_since - INVALIDATION_LOOKBACK
+    dropped = 0
+    cursor = db.user_invalidations.find({"at": {"$gte": since}}, {"user_id": 1, "at": 1})
+    async for invalidation in cursor:
+        if invalidation["_id"] in _invalidations_seen:
+            continue
+        _invalidations_seen[invalidation["_id"]] = invalidation["at"]
+        await cache.l1.delete(_user_cache_key(invalidation["user_id"]))
+        dropped += 1
+    for invalidation_id, at in list(_invalidations_seen.items()):
+        if at < since:
+            del _invalidations_seen[invalidation_id]
+    _invalidations_since = next_since
+    _invalidations_synced_at = polled_at
+    return dropped
+
+async def watch_invalidations(db, interval: float) -> None:
+    """Poll `user_invalidations` for the life of the worker"""
+    while True:
+        try:
+            await sync_invalidations(db)
+        except Exception as e:
+            # Cached users stop being served until a poll succeeds again
+            logger.error(f"Error polling user invalidations: {str(e)}")
+        await asyncio.sleep(interval)
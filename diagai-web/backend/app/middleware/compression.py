@@ -0,0 +1,179 @@
+import gzip
+import time
+import zlib
+from typing import Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import get_settings
+from app.core.metrics import COMPRESSION_BYTES, COMPRESSION_CPU_SECONDS, COMPRESSION_RATIO, route_template
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+settings = get_settings()
+
+# Encodings in order of preference
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Stored diagrams are PNG/GIF, which do not compress any further
+SKIP_PATH_PREFIXES = ("/storage",)
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml"
+)
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """The preferred encoding the client accepts, or None for identity"""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        try:
+            quality = float(params.strip().removeprefix("q=")) if params.strip() else 1.0
+        except ValueError:
+            quality = 0.0
+        accepted[coding.strip()] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+def compress(encoding: str, body: bytes) -> Tuple[bytes, float]:
+    """Compress a whole body; returns it with the CPU seconds spent"""
+    start = time.thread_time()
+    if encoding == "br":
+        compressed = brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+    return compressed, time.thread_time() - start
+
+class StreamCompressor:
+    """Incremental compressor for streamed bodies; each chunk is flushed so rows reach the client as sent"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self.cpu_seconds = 0.0
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes, final: bool) -> bytes:
+        start = time.thread_time()
+        if self.encoding == "br":
+            data = self._compressor.process(chunk)
+            data += self._compressor.finish() if final else self._compressor.flush()
+        else:
+            data = self._compressor.compress(chunk)
+            data += self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        self.cpu_seconds += time.thread_time() - start
+        return data
+
+def observe(scope: Scope, encoding: str, original: int, compressed: int, cpu_seconds: float) -> None:
+    route = route_template(scope)
+    COMPRESSION_BYTES.labels(route=route, encoding=encoding, stage="original").inc(original)
+    COMPRESSION_BYTES.labels(route=route, encoding=encoding, stage="compressed").inc(compressed)
+    COMPRESSION_CPU_SECONDS.labels(route=route, encoding=encoding).observe(cpu_seconds)
+    if original:
+        COMPRESSION_RATIO.labels(route=route, encoding=encoding).observe(compressed / original)
+
+class CompressionMiddleware:
+    """Compresses text and JSON responses with brotli or gzip, as the client accepts.
+
+    Bodies under COMPRESSION_MIN_SIZE go out as they are, and bodies over
+    COMPRESSION_OFFLOAD_SIZE are compressed in the threadpool so the event loop
+    keeps serving. Streamed responses (NDJSON) are compressed chunk by chunk.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE
+        self.offload_size = settings.COMPRESSION_OFFLOAD_SIZE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(SKIP_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        stream: Optional[StreamCompressor] = None
+        sizes = {"original": 0, "compressed": 0}
+
+        async def send_compressed(message: Message):
+            nonlocal start_message, stream
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                if (
+                    message["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type"))
+                ):
+                    await send(message)
+                    return
+                MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or (start_message is None and stream is None):
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if stream is not None:
+                data = stream.compress(body, final=not more_body)
+                sizes["original"] += len(body)
+                sizes["compressed"] += len(data)
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                if not more_body:
+                    observe(scope, encoding, sizes["original"], sizes["compressed"], stream.cpu_seconds)
+                return
+
+            headers = MutableHeaders(scope=start_message)
+            if more_body:
+                # Streaming response: length is unknown, compress as chunks arrive
+                stream = StreamCompressor(encoding)
+                del headers["content-length"]
+                headers["Content-Encoding"] = encoding
+                await send(start_message)
+                start_message = None
+                await send_compressed(message)
+                return
+
+            if len(body) < self.minimum_size:
+                await send(start_message)
+                start_message = None
+                await send(message)
+                return
+
+            if len(body) >= self.offload_size:
+                compressed, cpu_seconds = await run_in_threadpool(compress, encoding, body)
+            else:
+                compressed, cpu_seconds = compress(encoding, body)
+            observe(scope, encoding, len(body), len(compressed), cpu_seconds)
+
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start_message)
+            start_message = None
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
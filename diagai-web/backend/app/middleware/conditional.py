@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+from typing import Dict
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.metrics import CONDITIONAL_REQUEST_DURATION, CONDITIONAL_REQUESTS, NOT_MODIFIED_BYTES_SAVED, route_template
+
+# Body sizes of recently sent ETagged responses, to credit 304s with the bytes they saved
+MAX_TRACKED_ETAGS = 10000
+
+class ConditionalRequestMiddleware:
+    """Measures what ETag revalidation saves.
+
+    Counts ETagged responses per route as `modified` (full body sent) or
+    `not_modified` (304), times both, and credits each 304 with the size of
+    the body last sent for that ETag (or route).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.body_sizes: "OrderedDict[str, int]" = OrderedDict()
+        self.route_sizes: Dict[str, int] = {}
+
+    def remember(self, route: str, etag: str, size: int) -> None:
+        self.body_sizes[etag] = size
+        self.body_sizes.move_to_end(etag)
+        if len(self.body_sizes) > MAX_TRACKED_ETAGS:
+            self.body_sizes.popitem(last=False)
+        self.route_sizes[route] = size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        response = {"status": None, "etag": None, "size": 0}
+
+        async def send_and_measure(message: Message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["etag"] = Headers(raw=message.get("headers", [])).get("etag")
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, send_and_measure)
+
+        etag = response["etag"]
+        if etag is None:
+            return
+        route = route_template(scope)
+        result = "not_modified" if response["status"] == 304 else "modified"
+        CONDITIONAL_REQUESTS.labels(route=route, result=result).inc()
+        CONDITIONAL_REQUEST_DURATION.labels(route=route, result=result).observe(time.perf_counter() - start_time)
+        if result == "modified":
+            self.remember(route, etag, response["size"])
+        else:
+            saved = self.body_sizes.get(etag, self.route_sizes.get(route))
+            if saved:
+                NOT_MODIFIED_BYTES_SAVED.labels(route=route).inc(saved)
@@ -0,0 +1,47 @@
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import get_settings
+from app.core.db_monitoring import RequestDBStats, request_db_stats
+from app.core.metrics import DB_BYTES_PER_REQUEST, DB_COMMANDS_PER_REQUEST, DB_TIME_PER_REQUEST, route_template
+
+settings = get_settings()
+
+class DBBudgetMiddleware:
+    """Attributes database commands to the request that issued them.
+
+    Adds a `Server-Timing: db;dur=...` header with the command count, reply
+    bytes (with DB_COUNT_REPLY_BYTES) and reads saved by the user cache, and
+    records per-route histograms of the first three. Work done by the
+    request's BackgroundTasks counts towards the request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDBStats()
+        token = request_db_stats.set(stats)
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                size = f", {stats.bytes} bytes" if settings.DB_COUNT_REPLY_BYTES else ""
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.duration * 1000:.2f};desc="{stats.commands} queries{size}, {stats.reads_saved} reads saved"'
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_db_stats.reset(token)
+            method, route = scope["method"], route_template(scope)
+            DB_COMMANDS_PER_REQUEST.labels(method=method, route=route).observe(stats.commands)
+            DB_TIME_PER_REQUEST.labels(method=method, route=route).observe(stats.duration)
+            if settings.DB_COUNT_REPLY_BYTES:
+                DB_BYTES_PER_REQUEST.labels(method=method, route=route).observe(stats.bytes)
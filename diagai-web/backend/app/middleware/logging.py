@@ -1,75 +1,90 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from app.core.config import get_settings
+from app.core.logger import loggable_headers, loggable_query
 import logging
-import json
+import random
 import time
-from typing import Callable
-import sys
 
 settings = get_settings()
 
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, settings.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(settings.LOG_FILE),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
+# Records propagate to the queue pipeline set up in app.core.logger
 logger = logging.getLogger(__name__)
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable):
+def request_details(scope: Scope, path: str) -> dict:
+    client = scope.get("client")
+    return {
+        "method": scope["method"],
+        "path": path,
+        "query": loggable_query(scope.get("query_string", b"")),
+        "client_ip": client[0] if client else None,
+        "headers": loggable_headers(scope["headers"]),
+    }
+
+def sample_rate(status_code: int, duration: float) -> float:
+    """Share of such requests that are logged: errors and slow requests always, others LOG_SAMPLE_RATE"""
+    if status_code >= 400 or duration * 1000 >= settings.LOG_SLOW_REQUEST_MS:
+        return 1.0
+    return settings.LOG_SAMPLE_RATE
+
+class LoggingMiddleware:
+    """Logs each request with its status and processing time.
+
+    Pure ASGI: the status comes from `http.response.start` and the time is
+    taken when the last body chunk is sent, so background tasks that run
+    after the response are not counted. Successful requests are sampled.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         # Start timer
         start_time = time.time()
+        end_time = None
+        status_code = None
+        path = scope["path"]
         
-        # Get request details
-        request_details = {
-            "method": request.method,
-            "url": str(request.url),
-            "client_ip": request.client.host if request.client else None,
-            "headers": dict(request.headers),
-        }
+        async def send_and_record(message: Message):
+            nonlocal end_time, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                end_time = time.time()
+            await send(message)
         
-        response = None
         try:
             # Process request
-            response = await call_next(request)
-            
-            # Calculate processing time
-            process_time = time.time() - start_time
-            
-            # Log successful request
-            log_data = {
-                **request_details,
-                "status_code": response.status_code,
-                "processing_time": f"{process_time:.4f}s"
-            }
-            
-            if settings.LOG_FORMAT == "json":
-                logger.info(json.dumps(log_data))
-            else:
-                logger.info(f"Request processed: {log_data}")
-                
-            return response
-            
+            await self.app(scope, receive, send_and_record)
         except Exception as e:
-            # Calculate processing time
-            process_time = time.time() - start_time
-            
             # Log error
-            error_data = {
-                **request_details,
-                "error": str(e),
-                "processing_time": f"{process_time:.4f}s"
-            }
-            
-            if settings.LOG_FORMAT == "json":
-                logger.error(json.dumps(error_data))
-            else:
-                logger.error(f"Request failed: {error_data}")
-            
+            duration = time.time() - start_time
+            logger.error(
+                f"{scope['method']} {path} failed after {duration:.4f}s: {e}",
+                extra={"extra_fields": {
+                    **request_details(scope, path),
+                    "error": str(e),
+                    "processing_time": f"{duration:.4f}s"
+                }}
+            )
             raise  # Re-raise the exception
+        
+        # Log successful request
+        duration = (end_time or time.time()) - start_time
+        if status_code is None:
+            return
+        rate = sample_rate(status_code, duration)
+        if rate < 1 and random.random() >= rate:
+            return
+        logger.info(
+            f"{scope['method']} {path} {status_code} {duration:.4f}s",
+            extra={"extra_fields": {
+                **request_details(scope, path),
+                "status_code": status_code,
+                "processing_time": f"{duration:.4f}s",
+                "sample_rate": rate
+            }}
+        )
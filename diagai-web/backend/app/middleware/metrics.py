@@ -1,48 +1,52 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
-from prometheus_client import Counter, Histogram
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.metrics import REQUEST_COUNT, REQUEST_LATENCY, route_template
 import time
 
-# Define metrics
-REQUEST_COUNT = Counter(
-    'http_requests_total',
-    'Total HTTP requests',
-    ['method', 'endpoint', 'status']
-)
+class MetricsMiddleware:
+    """Counts requests by route template and status and records their latency.
 
-REQUEST_LATENCY = Histogram(
-    'http_request_duration_seconds',
-    'HTTP request latency',
-    ['method', 'endpoint']
-)
+    Pure ASGI: the status comes from `http.response.start` and the latency
+    ends when the last body chunk is sent. Unhandled errors count as 500s.
+    """
 
-class MetricsMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp):
+        self.app = app
     
-    async def dispatch(self, request: Request, call_next) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         # Start timer
         start_time = time.time()
+        end_time = None
+        status_code = 500
         
-        # Process request
-        response = await call_next(request)
-        
-        # Record metrics
-        duration = time.time() - start_time
-        endpoint = request.url.path
-        method = request.method
-        
-        # Update metrics
-        REQUEST_COUNT.labels(
-            method=method,
-            endpoint=endpoint,
-            status=response.status_code
-        ).inc()
-        
-        REQUEST_LATENCY.labels(
-            method=method,
-            endpoint=endpoint
-        ).observe(duration)
+        async def send_and_record(message: Message):
+            nonlocal end_time, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                end_time = time.time()
+            await send(message)
         
-        return response
+        try:
+            # Process request
+            await self.app(scope, receive, send_and_record)
+        finally:
+            # Record metrics
+            duration = (end_time or time.time()) - start_time
+            route = route_template(scope)
+            method = scope["method"]
+            
+            # Update metrics
+            REQUEST_COUNT.labels(
+                method=method,
+                route=route,
+                status=status_code
+            ).inc()
+            
+            REQUEST_LATENCY.labels(
+                method=method,
+                route=route
+            ).observe(duration)
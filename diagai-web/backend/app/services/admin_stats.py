@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.cache import cache
+from app.core.config import get_settings
+from app.core.logger import logger
+from app.core.metrics import USER_CREDITS_OUTSTANDING, USERS_BY_CREDIT_BALANCE
+
+settings = get_settings()
+
+SNAPSHOT_ID = "admin_stats"
+CACHE_KEY = "snapshot:admin_stats"
+
+# Lower bounds of the credit balance ranges users are counted in; negative
+# balances get a range of their own
+CREDIT_BALANCE_BOUNDARIES = [0, 1, 5, 10, 25, 50, 100, 250, 500, 1000]
+NEGATIVE_BALANCE = "<0"
+
+def _balance_range(lower) -> str:
+    if lower == NEGATIVE_BALANCE:
+        return NEGATIVE_BALANCE
+    if lower == CREDIT_BALANCE_BOUNDARIES[-1]:
+        return f"{lower}+"
+    upper = CREDIT_BALANCE_BOUNDARIES[CREDIT_BALANCE_BOUNDARIES.index(lower) + 1] - 1
+    return str(lower) if upper == lower else f"{lower}-{upper}"
+
+def publish_metrics(snapshot: dict) -> None:
+    """Expose the snapshot's credit aggregates as gauges, instead of one series per user"""
+    credits = snapshot.get("credits", {})
+    USER_CREDITS_OUTSTANDING.set(credits.get("total", 0))
+    for balance_range, count in credits.get("by_balance", {}).items():
+        USERS_BY_CREDIT_BALANCE.labels(range=balance_range).set(count)
+
+def _count(*stages: dict) -> list:
+    return [*stages, {"$count": "n"}]
+
+def _first(facet: list, field: str = "n", default=0):
+    return facet[0][field] if facet else default
+
+class AdminStatsMaterializer:
+    """Computes the admin dashboard stats and keeps the latest snapshot.
+
+    The snapshot is stored in the `snapshots` collection so every worker serves
+    the same numbers, and held in the L1 cache between refreshes. A scheduled
+    cluster job refreshes it; `refresh()` can also be called on demand.
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    async def compute(self, db: AsyncIOMotorDatabase) -> dict:
+        """Compute the stats with one $facet pass over users and one over diagrams"""
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        recent = {
+            "$match": {
+                "$or": [
+                    {"created_at": {"$gte": thirty_days_ago}},
+                    {"createdAt": {"$gte": thirty_days_ago}}  # Handle both field names
+                ]
+            }
+        }
+
+        users_pipeline = [{
+            "$facet": {
+                "total": _count(),
+                "new": _count(recent),
+                "credits": [
+                    {"$group": {"_id": None, "total": {"$sum": {"$ifNull": ["$credits", 0]}}}}
+                ],
+                "by_balance": [
+                    {"$bucket": {
+                        "groupBy": {"$ifNull": ["$credits", 0]},
+                        "boundaries": CREDIT_BALANCE_BOUNDARIES + [float("inf")],
+                        "default": NEGATIVE_BALANCE,
+                        "output": {"count": {"$sum": 1}}
+                    }}
+                ]
+            }
+        }]
+        diagrams_pipeline = [{
+            "$facet": {
+                "total": _count(),
+                "new": _count(recent),
+                "active_users": _count(recent, {"$group": {"_id": "$user_id"}}),
+                "by_status": [
+                    {"$group": {"_id": {"$ifNull": ["$status", "pending"]}, "count": {"$sum": 1}}}
+                ]
+            }
+        }]
+        (users,), (diagrams,) = await asyncio.gather(
+            db.users.aggregate(users_pipeline).to_list(length=1),
+            db.diagrams.aggregate(diagrams_pipeline).to_list(length=1)
+        )
+
+        diagrams_by_status = {item["_id"]: item["count"] for item in diagrams["by_status"]}
+        return {
+            "users": {
+                "total": _first(users["total"]),
+                "new": _first(users["new"]),
+                "active": _first(diagrams["active_users"])
+            },
+            "diagrams": {
+                "total": _first(diagrams["total"]),
+                "new": _first(diagrams["new"]),
+                "by_status": diagrams_by_status or {"pending": 0, "completed": 0}
+            },
+            "credits": {
+                "total": _first(users["credits"], "total"),
+                "by_balance": {
+                    **{_balance_range(lower): 0 for lower in [NEGATIVE_BALANCE, *CREDIT_BALANCE_BOUNDARIES]},
+                    **{_balance_range(bucket["_id"]): bucket["count"] for bucket in users["by_balance"]}
+                }
+            },
+            "computed_at": datetime.utcnow()
+        }
+
+    async def refresh(self, db: AsyncIOMotorDatabase) -> dict:
+        """Recompute and store the snapshot; concurrent callers share one run"""
+        if self._lock.locked():
+            async with self._lock:
+                pass
+            snapshot = await cache.l1.get(CACHE_KEY)
+            if snapshot is not None:
+                return snapshot
+
+        async with self._lock:
+            start_time = datetime.utcnow()
+            snapshot = await self.compute(db)
+            await db.snapshots.replace_one({"_id": SNAPSHOT_ID}, {"_id": SNAPSHOT_ID, **snapshot}, upsert=True)
+            await cache.l1.set(CACHE_KEY, snapshot, expire=settings.ADMIN_STATS_REFRESH_INTERVAL)
+            publish_metrics(snapshot)
+            logger.info(f"Admin stats refreshed in {(datetime.utcnow() - start_time).total_seconds():.3f}s")
+            return snapshot
+
+    async def get(self, db: AsyncIOMotorDatabase) -> dict:
+        """Latest snapshot, computing the first one if none exists yet"""
+        snapshot: Optional[dict] = await cache.l1.get(CACHE_KEY)
+        if snapshot is not None:
+            return snapshot
+
+        snapshot = await db.snapshots.find_one({"_id": SNAPSHOT_ID}, {"_id": 0})
+        if snapshot is None:
+            return await self.refresh(db)
+
+        await cache.l1.set(CACHE_KEY, snapshot, expire=settings.ADMIN_STATS_REFRESH_INTERVAL)
+        publish_metrics(snapshot)
+        return snapshot
+
+admin_stats = AdminStatsMaterializer()
@@ -2,7 +2,6 @@ import os
 import shutil
 import tarfile
 from datetime import datetime
-import boto3
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import get_settings
@@ -14,16 +13,24 @@ class BackupService:
     def __init__(self):
         self.backup_dir = os.path.join("backups")
         self.storage_dir = settings.STORAGE_PATH
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_KEY")
-        ) if os.getenv("AWS_ACCESS_KEY") else None
+        self._s3_client = None
         self.s3_bucket = os.getenv("AWS_BACKUP_BUCKET")
         
         # Create backup directory if it doesn't exist
         os.makedirs(self.backup_dir, exist_ok=True)
     
+    @property
+    def s3_client(self):
+        """Create the S3 client on first use; boto3 is slow to import"""
+        if self._s3_client is None and os.getenv("AWS_ACCESS_KEY"):
+            import boto3
+            self._s3_client = boto3.client(
+                's3',
+                aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+                aws_secret_access_key=os.getenv("AWS_SECRET_KEY")
+            )
+        return self._s3_client
+    
     async def create_backup(self):
         """Create a full backup of the database and files"""
         try:
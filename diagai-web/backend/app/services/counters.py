@@ -0,0 +1,158 @@
+from typing import Any, Dict, Iterable, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from app.core.user_cache import invalidate_user
+from app.core.logger import logger
+
+# Per-user counters live on the user document under `stats`, so the dashboard
+# reads them with the user it already loaded. Writers fold the `$inc` deltas
+# below into the update they are already making where they can (e.g. the
+# credit deduction), and `recompute_user_counters` repairs any drift.
+STATUS_COUNTERS = {
+    "completed": "stats.completed_diagrams",
+    "failed": "stats.failed_diagrams"
+}
+
+# Set in `stats` by `recompute_user_counters` and at signup. Users without it
+# (created before counters existed) may hold partial counters from `$inc`s
+# and are backfilled on first read.
+STATS_VERSION = 1
+
+EMPTY_STATS = {
+    "total_diagrams": 0,
+    "completed_diagrams": 0,
+    "failed_diagrams": 0,
+    "total_projects": 0,
+    "credits_consumed": 0
+}
+
+def new_user_stats() -> Dict[str, int]:
+    """`stats` of a user created with no diagrams or projects"""
+    return {**EMPTY_STATS, "v": STATS_VERSION}
+
+def merge(*deltas: Dict[str, int]) -> Dict[str, int]:
+    """Sum several `$inc` deltas into one"""
+    merged: Dict[str, int] = {}
+    for delta in deltas:
+        for field, value in delta.items():
+            merged[field] = merged.get(field, 0) + value
+    return {field: value for field, value in merged.items() if value}
+
+def diagram_created(credits_used: int) -> Dict[str, int]:
+    return {"stats.total_diagrams": 1, "stats.credits_consumed": credits_used}
+
+def diagram_status_changed(old_status: Optional[str], new_status: Optional[str]) -> Dict[str, int]:
+    delta: Dict[str, int] = {}
+    if old_status == new_status:
+        return delta
+    if old_status in STATUS_COUNTERS:
+        delta[STATUS_COUNTERS[old_status]] = -1
+    if new_status in STATUS_COUNTERS:
+        delta[STATUS_COUNTERS[new_status]] = 1
+    return delta
+
+def credits_refunded(credits: int) -> Dict[str, int]:
+    return {"credits": credits, "stats.credits_consumed": -credits}
+
+def diagram_deleted(diagram: dict) -> Dict[str, int]:
+    return merge(
+        {"stats.total_diagrams": -1},
+        diagram_status_changed(diagram.get("status"), None)
+    )
+
+def diagrams_deleted(status_counts: Dict[Any, int]) -> Dict[str, int]:
+    """Delta for a bulk delete, given the deleted diagrams counted by status"""
+    return merge(
+        {"stats.total_diagrams": -sum(status_counts.values())},
+        *(
+            {STATUS_COUNTERS[status]: -count}
+            for status, count in status_counts.items()
+            if status in STATUS_COUNTERS
+        )
+    )
+
+def project_created() -> Dict[str, int]:
+    return {"stats.total_projects": 1}
+
+def project_deleted() -> Dict[str, int]:
+    return {"stats.total_projects": -1}
+
+async def apply_counters(db: AsyncIOMotorDatabase, user_id: Any, delta: Dict[str, int]) -> None:
+    """Apply a counter delta to a user"""
+    if not delta:
+        return
+    await db.users.update_one({"_id": user_id}, {"$inc": delta})
+    await invalidate_user(db, user_id)
+
+async def recompute_user_counters(
+    db: AsyncIOMotorDatabase,
+    user_ids: Optional[Iterable[Any]] = None
+) -> int:
+    """Recompute `stats` from the diagrams and projects collections.
+
+    Recomputes every user when `user_ids` is None. Returns the number of
+    users updated.
+    """
+    user_query: dict = {}
+    match: dict = {}
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        user_query = {"_id": {"$in": user_ids}}
+        match = {"user_id": {"$in": [str(user_id) for user_id in user_ids]}}
+
+    diagram_stats = await db.diagrams.aggregate([
+        {"$match": match},
+        {
+            "$group": {
+                "_id": "$user_id",
+                "total_diagrams": {"$sum": 1},
+                "completed_diagrams": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}},
+                "failed_diagrams": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}},
+                "credits_consumed": {
+                    "$sum": {
+                        "$cond": [
+                            {"$eq": ["$status", "failed"]},
+                            0,
+                            {"$ifNull": ["$credits_used", 0]}
+                        ]
+                    }
+                }
+            }
+        }
+    ]).to_list(length=None)
+    project_stats = await db.projects.aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$user_id", "total_projects": {"$sum": 1}}}
+    ]).to_list(length=None)
+
+    stats_by_user: Dict[str, dict] = {}
+    for item in diagram_stats:
+        stats = stats_by_user.setdefault(str(item.pop("_id")), dict(EMPTY_STATS))
+        stats.update(item)
+    for item in project_stats:
+        stats = stats_by_user.setdefault(str(item["_id"]), dict(EMPTY_STATS))
+        stats["total_projects"] = item["total_projects"]
+
+    updated_ids = []
+    operations = []
+    async for user in db.users.find(user_query, {"_id": 1}):
+        stats = {**stats_by_user.get(str(user["_id"]), EMPTY_STATS), "v": STATS_VERSION}
+        operations.append(UpdateOne({"_id": user["_id"]}, {"$set": {"stats": stats}}))
+        updated_ids.append(user["_id"])
+
+    for start in range(0, len(operations), 1000):
+        await db.users.bulk_write(operations[start:start + 1000], ordered=False)
+    for user_id in updated_ids:
+        await invalidate_user(db, user_id)
+
+    logger.info(f"Recomputed counters for {len(updated_ids)} users")
+    return len(updated_ids)
+
+async def user_stats(db: AsyncIOMotorDatabase, user: dict) -> dict:
+    """Counters of a loaded user, backfilling users whose counters predate STATS_VERSION"""
+    stats = user.get("stats") or {}
+    if stats.get("v") != STATS_VERSION:
+        await recompute_user_counters(db, [user["_id"]])
+        refreshed = await db.users.find_one({"_id": user["_id"]}, {"stats": 1})
+        stats = (refreshed or {}).get("stats") or {}
+    return {field: stats.get(field, 0) for field in EMPTY_STATS}
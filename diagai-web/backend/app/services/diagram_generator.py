@@ -6,6 +6,8 @@ from typing import List, Optional, Tuple
 import base64
 from app.core.config import get_settings
 from app.services.storage import StorageService
+from app.core.cache import cache
+import hashlib
 import json
 import asyncio
 from groq import AsyncGroq
@@ -375,6 +377,12 @@ class DiagramGenerator:
             # Clean up the Mermaid code
             mermaid_code = mermaid_code.replace("\\n", "\n").strip()
             
+            # Rendering is deterministic, so reuse any image already rendered for this code
+            cache_key = f"render:{diagram_type}:{hashlib.sha256(mermaid_code.encode()).hexdigest()}"
+            cached_image = await cache.get(cache_key)
+            if cached_image is not None:
+                return cached_image
+            
             # Encode mermaid code for URL
             encoded_code = base64.b64encode(mermaid_code.encode()).decode()
             # Add size parameters to URL for larger image
@@ -396,6 +404,7 @@ class DiagramGenerator:
                     if not image_data:
                         raise ValueError("Empty image data received")
                     
+                    await cache.set(cache_key, image_data, expire=settings.CACHE_RENDER_TTL)
                     return image_data
                     
         except Exception as e:
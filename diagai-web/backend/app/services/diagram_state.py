@@ -0,0 +1,55 @@
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.user_cache import invalidate_user
+from app.core.logger import logger
+from app.core.metrics import DIAGRAM_WRITES
+from app.services import counters, usage
+
+# Diagram generation lifecycle. A diagram is created "processing" and moves
+# exactly once to a final status; the frontend polls until it leaves
+# "processing". Final statuses are never overwritten by the generator.
+TRANSITIONS = {
+    "processing": ("completed", "failed")
+}
+
+async def transition(
+    db: AsyncIOMotorDatabase,
+    diagram: dict,
+    new_status: str,
+    writes: int = 0,
+    **fields
+) -> bool:
+    """Compare-and-set `diagram` from its current status to `new_status`.
+
+    `diagram` is the document the generator already holds (user_id, type,
+    created_at, credits_used), so no read is needed. Moving to "failed"
+    refunds the credits in the same user write that updates the counters.
+    Returns False, without side effects, if the diagram was no longer in the
+    expected status (e.g. deleted or changed meanwhile). `writes` is the number
+    of writes already made for this diagram, for the DIAGRAM_WRITES metric.
+    """
+    old_status = diagram["status"]
+    if new_status not in TRANSITIONS.get(old_status, ()):
+        raise ValueError(f"Invalid diagram transition {old_status} -> {new_status}")
+
+    now = datetime.utcnow()
+    result = await db.diagrams.update_one(
+        {"_id": diagram["_id"], "status": old_status},
+        {"$set": {"status": new_status, "updated_at": now, **fields}}
+    )
+    writes += 1
+    if result.modified_count == 0:
+        logger.warning(f"Diagram {diagram['_id']} left {old_status} before {new_status}; skipping")
+        return False
+
+    user_delta = counters.diagram_status_changed(old_status, new_status)
+    if new_status == "failed":
+        user_delta = counters.merge(user_delta, counters.credits_refunded(diagram["credits_used"]))
+    await db.users.update_one({"_id": diagram["user_id"]}, {"$inc": user_delta})
+    await invalidate_user(db, diagram["user_id"])
+    await usage.record_status_change(db, diagram, old_status, new_status)
+    writes += 2
+
+    diagram.update(status=new_status, updated_at=now, **fields)
+    DIAGRAM_WRITES.labels(status=new_status).observe(writes)
+    return True
@@ -0,0 +1,176 @@
+# Daily usage rollup: one `usage_daily` document per (user_id, day, type,
+# status) holding how many of the user's diagrams created that day are in that
+# state. It is kept current on every diagram status change so usage charts are
+# a single indexed range read. Rebuild it from `diagrams` with:
+#
+#     python -m app.services.usage --backfill
+import argparse
+import asyncio
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from app.core.config import get_settings
+from app.core.indexes import INDEXES, sync_indexes
+from app.core.logger import logger
+
+settings = get_settings()
+
+# `backfill` builds the new rollup here before swapping it in
+REBUILD_COLLECTION = "usage_daily_rebuild"
+
+def day_of(value: Optional[datetime]) -> datetime:
+    """Midnight (UTC) of the day a diagram was created"""
+    value = value or datetime.utcnow()
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _key(user_id: Any, day: datetime, type: Optional[str], status: Optional[str]) -> dict:
+    return {"user_id": str(user_id), "day": day, "type": type, "status": status}
+
+async def record_status_change(
+    db: AsyncIOMotorDatabase,
+    diagram: dict,
+    old_status: Optional[str],
+    new_status: Optional[str]
+) -> None:
+    """Move a diagram between status buckets; None means created / deleted.
+
+    `diagram` needs `user_id`, `created_at` and `type`.
+    """
+    if old_status == new_status:
+        return
+    day = day_of(diagram.get("created_at"))
+    operations = []
+    if old_status is not None:
+        operations.append(UpdateOne(
+            _key(diagram["user_id"], day, diagram.get("type"), old_status),
+            {"$inc": {"count": -1}}
+        ))
+    if new_status is not None:
+        operations.append(UpdateOne(
+            _key(diagram["user_id"], day, diagram.get("type"), new_status),
+            {"$inc": {"count": 1}},
+            upsert=True
+        ))
+    try:
+        await db.usage_daily.bulk_write(operations, ordered=False)
+    except Exception as e:
+        # The rollup is derived data; the backfill repairs a missed update
+        logger.error(f"Error updating usage rollup: {str(e)}")
+
+async def record_created(db: AsyncIOMotorDatabase, diagram: dict) -> None:
+    await record_status_change(db, diagram, None, diagram.get("status"))
+
+async def record_deleted(db: AsyncIOMotorDatabase, diagram: dict) -> None:
+    await record_status_change(db, diagram, diagram.get("status"), None)
+
+def _group_stage() -> dict:
+    return {
+        "$group": {
+            "_id": {
+                "user_id": {"$toString": "$user_id"},
+                "day": {
+                    "$dateFromParts": {
+                        "year": {"$year": "$created_at"},
+                        "month": {"$month": "$created_at"},
+                        "day": {"$dayOfMonth": "$created_at"}
+                    }
+                },
+                "type": {"$ifNull": ["$type", None]},
+                "status": {"$ifNull": ["$status", None]}
+            },
+            "count": {"$sum": 1}
+        }
+    }
+
+async def breakdown(db: AsyncIOMotorDatabase, query: dict) -> List[dict]:
+    """Rollup buckets of the diagrams matching `query`, e.g. before a bulk delete"""
+    groups = await db.diagrams.aggregate([
+        {"$match": query},
+        _group_stage()
+    ]).to_list(length=None)
+    return [{**group["_id"], "count": group["count"]} for group in groups]
+
+def by_status(buckets: List[dict]) -> Dict[Any, int]:
+    """Total a breakdown per status"""
+    totals: Counter = Counter()
+    for bucket in buckets:
+        totals[bucket["status"]] += bucket["count"]
+    return dict(totals)
+
+async def remove(db: AsyncIOMotorDatabase, buckets: List[dict]) -> None:
+    """Subtract a breakdown of deleted diagrams from the rollup"""
+    if not buckets:
+        return
+    await db.usage_daily.bulk_write([
+        UpdateOne(
+            _key(bucket["user_id"], bucket["day"], bucket["type"], bucket["status"]),
+            {"$inc": {"count": -bucket["count"]}}
+        )
+        for bucket in buckets
+    ], ordered=False)
+
+async def daily_counts(
+    db: AsyncIOMotorDatabase,
+    user_id: Any,
+    since: datetime,
+    status: Optional[str] = None
+) -> Dict[datetime, int]:
+    """Diagrams created per day from `since` on, optionally in one status"""
+    query: Dict[str, Any] = {"user_id": str(user_id), "day": {"$gte": day_of(since)}}
+    if status:
+        query["status"] = status
+
+    counts: Counter = Counter()
+    async for bucket in db.usage_daily.find(query, {"_id": 0, "day": 1, "count": 1}):
+        counts[bucket["day"]] += bucket["count"]
+    return dict(counts)
+
+async def backfill(db: AsyncIOMotorDatabase) -> int:
+    """Rebuild the rollup from the diagrams collection.
+
+    The new rollup is built in a side collection that then replaces
+    `usage_daily` in one rename, so readers never see it empty or half
+    built. Rollup updates made while the aggregation runs are lost with the
+    old collection; run it when diagrams are not being written.
+    """
+    rebuild = db[REBUILD_COLLECTION]
+    await rebuild.drop()
+    for spec in INDEXES:
+        if spec.collection == "usage_daily":
+            await rebuild.create_index(list(spec.keys), **spec.options)
+    await db.diagrams.aggregate([
+        {"$match": {"created_at": {"$type": "date"}}},
+        _group_stage(),
+        {
+            "$project": {
+                "_id": 0,
+                "user_id": "$_id.user_id",
+                "day": "$_id.day",
+                "type": "$_id.type",
+                "status": "$_id.status",
+                "count": 1
+            }
+        },
+        {"$out": REBUILD_COLLECTION}
+    ]).to_list(length=None)
+    await rebuild.rename("usage_daily", dropTarget=True)
+    total = await db.usage_daily.count_documents({})
+    logger.info(f"Backfilled {total} usage rollup buckets")
+    return total
+
+async def _main(args) -> None:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    try:
+        database = client.get_database("diagai_db")
+        await sync_indexes(database)
+        if args.backfill:
+            print(f"buckets: {await backfill(database)}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the usage_daily rollup")
+    parser.add_argument("--backfill", action="store_true", help="rebuild the rollup from diagrams")
+    asyncio.run(_main(parser.parse_args()))
@@ -1,18 +1,26 @@
+from app.core.profiling import startup_profiler
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
+import asyncio
 import os
 from app.api.v1 import auth, users, projects, diagrams, admin, health, metrics
 from app.core.config import get_settings
 from app.middleware.rate_limit import RateLimitMiddleware
 from app.middleware.logging import LoggingMiddleware
 from app.middleware.metrics import MetricsMiddleware
-from app.core.logger import logger
+from app.middleware.db_budget import DBBudgetMiddleware
+from app.middleware.conditional import ConditionalRequestMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.core.logger import logger, stop_logging
 from app.core.docs import custom_openapi
 from app.core.scheduler import scheduler
 from app.core.cache import cache
 from app.core.database import db
+from app.core.metrics import monitor_event_loop_lag
+from app.core.user_cache import watch_invalidations
+from app.core.responses import ORJSONResponse, ORJSONRoute
 
 # Load environment variables
 load_dotenv()
@@ -26,51 +34,79 @@ app = FastAPI(
     description="API for DiaAI - AI-powered diagram generation",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    default_response_class=ORJSONResponse
 )
+app.router.route_class = ORJSONRoute
 
 # Customize OpenAPI documentation
 app.openapi = custom_openapi()
 
-# Add middlewares
-app.add_middleware(LoggingMiddleware)  # Add logging first to catch all requests
+# Add middlewares; the last one added runs outermost
 app.add_middleware(MetricsMiddleware)  # Add metrics middleware
+app.add_middleware(DBBudgetMiddleware)  # Per-request database command budget
+app.add_middleware(ConditionalRequestMiddleware)  # Bytes and time saved by ETag revalidation
+app.add_middleware(CompressionMiddleware)  # gzip/brotli for JSON and text bodies
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.BACKEND_CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing", "ETag"],
 )
+app.add_middleware(LoggingMiddleware)  # Added last so it times and logs every request, CORS preflights included
 # app.add_middleware(RateLimitMiddleware)
 
 # Mount static files
 app.mount("/storage", StaticFiles(directory=settings.STORAGE_PATH), name="storage")
 
+startup_profiler.phases["import"] = startup_profiler.elapsed()
+
+async def create_indexes():
+    """Build indexes in the background so they never delay serving"""
+    try:
+        with startup_profiler.phase("indexes"):
+            await db.create_indexes()
+        logger.info("Database indexes created")
+    except Exception as e:
+        logger.error(f"Error creating database indexes: {str(e)}", exc_info=True)
+
 # Startup event
 @app.on_event("startup")
 async def startup():
     try:
         # Connect to database
-        await db.connect_to_database()
+        with startup_profiler.phase("database"):
+            await db.connect_to_database()
         logger.info("Successfully connected to MongoDB")
         
         # Create indexes
-        database = db.get_db()
-        await database.users.create_index("email", unique=True)
-        await database.users.create_index("firebase_uid", unique=True)
-        await database.projects.create_index([("user_id", 1), ("name", 1)])
-        await database.diagrams.create_index([("user_id", 1), ("project_id", 1)])
-        logger.info("Database indexes created")
+        app.state.index_task = asyncio.create_task(create_indexes())
         
         # Initialize cache
-        await cache.init()
-        logger.info("Memory cache initialized")
+        with startup_profiler.phase("cache"):
+            await cache.init()
+        logger.info("Cache initialized")
+        
+        # Pick up user cache invalidations made by other workers
+        app.state.user_invalidations_task = asyncio.create_task(
+            watch_invalidations(db.get_db(), settings.USER_INVALIDATION_POLL_INTERVAL)
+        )
         
         # Start scheduler
-        scheduler.start()
+        with startup_profiler.phase("scheduler"):
+            scheduler.start()
         logger.info("Background scheduler started")
         
+        # Watch for blocking calls on the event loop
+        app.state.loop_lag_task = asyncio.create_task(
+            monitor_event_loop_lag(settings.EVENT_LOOP_LAG_INTERVAL)
+        )
+        
+        startup_profiler.mark_ready()
+        logger.info(f"Startup profile: {startup_profiler.report(top=10)}")
+        
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}", exc_info=True)
         raise
@@ -78,17 +114,31 @@ async def startup():
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown():
+    # Stop event loop monitor
+    loop_lag_task = getattr(app.state, "loop_lag_task", None)
+    if loop_lag_task:
+        loop_lag_task.cancel()
+    
+    # Stop polling user cache invalidations
+    user_invalidations_task = getattr(app.state, "user_invalidations_task", None)
+    if user_invalidations_task:
+        user_invalidations_task.cancel()
+    
+    # Shutdown scheduler and hand over leadership while the database is up
+    scheduler.shutdown()
+    await scheduler.release_leadership()
+    logger.info("Background scheduler shutdown")
+    
     # Close database connection
     await db.close_database_connection()
     logger.info("Database connection closed")
     
     # Close cache
     await cache.close()
-    logger.info("Memory cache cleared")
+    logger.info("Cache closed")
     
-    # Shutdown scheduler
-    scheduler.shutdown()
-    logger.info("Background scheduler shutdown")
+    # Flush queued log records
+    stop_logging()
 
 # Include routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["Authentication"])
@@ -0,0 +1,166 @@
+import pytest
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi import HTTPException, Response
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.api.v1.admin import ADMIN_EMAIL, _users_by_id, get_admin_stats, get_users, get_diagrams, get_projects, get_project
+from app.core.config import get_settings
+from app.core.security import create_access_token
+from app.core.dataloader import Loaders
+
+settings = get_settings()
+
+PAGE_SIZE = 100
+
+async def seed_page(db):
+    """Insert a full admin page of users, each with a project, diagrams and outputs."""
+    now = datetime.utcnow()
+    users, projects, diagrams, outputs = [], [], [], []
+    for i in range(PAGE_SIZE):
+        user_id = str(ObjectId())
+        project_id = ObjectId()
+        users.append({
+            "_id": user_id,
+            "email": f"user{i}@example.com",
+            "name": f"User {i}",
+            "firebase_uid": f"uid-{i}",
+            "credits": 10,
+            "created_at": now - timedelta(minutes=i)
+        })
+        projects.append({
+            "_id": project_id,
+            "user_id": user_id,
+            "name": f"Project {i}",
+            "created_at": now - timedelta(minutes=i)
+        })
+        for j in range(2):
+            diagram_id = str(ObjectId())
+            diagrams.append({
+                "_id": diagram_id,
+                "user_id": user_id,
+                "project_id": str(project_id),
+                "status": "completed",
+                "type": "image",
+                "created_at": now - timedelta(minutes=i, seconds=j)
+            })
+            outputs.append({
+                "diagram_id": diagram_id,
+                "url": f"http://localhost/{diagram_id}.png",
+                "created_at": now
+            })
+    await db.users.insert_many(users)
+    await db.projects.insert_many(projects)
+    await db.diagrams.insert_many(diagrams)
+    await db.outputs.insert_many(outputs)
+    return projects
+
+async def test_get_users_query_budget(db, query_counter):
+    await seed_page(db)
+    query_counter.reset()
+
+    result = await get_users(
+        page=1, limit=PAGE_SIZE, search="", sort_by="created_at", sort_order="desc",
+        cursor=None, include_total=True, db=db
+    )
+
+    assert len(result["users"]) == PAGE_SIZE
+    assert all(user["total_diagrams"] == 2 for user in result["users"] if user["email"].startswith("user"))
+    # count + page + one batched diagram count
+    assert query_counter.count <= 3
+
+async def test_page_numbers_stop_at_max_offset(db):
+    params = dict(limit=100, search="", sort_by="created_at", sort_order="desc", include_total=False, db=db)
+    last_page = settings.PAGINATION_MAX_OFFSET // 100 + 1
+    await get_users(page=last_page, cursor=None, **params)
+    
+    # Deeper pages must follow next_cursor instead of skipping rows
+    with pytest.raises(HTTPException) as error:
+        await get_users(page=last_page + 1, cursor=None, **params)
+    assert error.value.status_code == 400
+
+async def test_get_diagrams_query_budget(db, query_counter, test_admin):
+    await seed_page(db)
+    query_counter.reset()
+
+    result = await get_diagrams(
+        page=1, limit=PAGE_SIZE, search=None, status=None, type=None,
+        sort_by=None, sort_order="desc", cursor=None, include_total=True,
+        view="summary", fields=None, current_admin=test_admin, db=db,
+        loaders=Loaders(db)
+    )
+
+    assert len(result["diagrams"]) == PAGE_SIZE
+    assert all(diagram["user"] is not None for diagram in result["diagrams"])
+    # count + page + one batched user lookup
+    assert query_counter.count <= 3
+
+async def test_get_projects_query_budget(db, query_counter):
+    await seed_page(db)
+    query_counter.reset()
+
+    result = await get_projects(
+        page=1, limit=PAGE_SIZE, search="", sort_by="created_at", sort_order="desc",
+        cursor=None, include_total=True, db=db, loaders=Loaders(db)
+    )
+
+    assert len(result["projects"]) == PAGE_SIZE
+    assert all(project["diagrams_count"] == 2 for project in result["projects"])
+    # count + page + batched users + batched diagram counts
+    assert query_counter.count <= 4
+
+async def test_get_project_query_budget(db, query_counter):
+    projects = await seed_page(db)
+    query_counter.reset()
+
+    result = await get_project(project_id=str(projects[0]["_id"]), response=Response(), limit=100, cursor=None, db=db)
+
+    assert len(result["diagrams"]) == 2
+    assert all(diagram["image_url"] for diagram in result["diagrams"])
+    # project + owner + diagrams + one batched output lookup
+    assert query_counter.count <= 4
+
+async def test_get_project_pages_diagrams(db):
+    projects = await seed_page(db)
+    project_id = str(projects[0]["_id"])
+
+    response = Response()
+    first = await get_project(project_id=project_id, response=response, limit=1, cursor=None, db=db)
+    cursor = response.headers["X-Next-Cursor"]
+    second = await get_project(project_id=project_id, response=Response(), limit=1, cursor=cursor, db=db)
+    assert [d["id"] for d in first["diagrams"]] != [d["id"] for d in second["diagrams"]]
+
+    with pytest.raises(HTTPException) as error:
+        await get_project(project_id=str(ObjectId()), response=Response(), limit=1, cursor=None, db=db)
+    assert error.value.status_code == 404
+
+async def test_users_by_id_fetches_summary_fields(db, query_counter):
+    user_id = str(ObjectId())
+    await db.users.insert_one({
+        "_id": user_id, "email": "row@example.com", "name": "Row", "credits": 10,
+        "stats": {"total_projects": 3}, "firebase_uid": "uid-row"
+    })
+    query_counter.reset()
+    
+    loaders = Loaders(db)
+    users = await _users_by_id(loaders, [user_id, user_id, None])
+    
+    assert set(users[user_id]) == {"_id", "email", "name"}
+    assert query_counter.count == 1
+    # Whole-document loads are memoized separately
+    assert not loaders.users.is_loaded(user_id)
+
+async def test_admin_stats_refresh_with_admin_login_token(db, make_request):
+    token = create_access_token(data={"sub": ADMIN_EMAIL, "is_admin": True})
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    
+    snapshot = await get_admin_stats(make_request("/api/v1/admin/stats"), Response(), refresh=True, credentials=credentials, db=db)
+    assert snapshot["users"]["total"] >= 2
+    
+    # Reading the snapshot needs no token, like the other admin listings
+    cached = await get_admin_stats(make_request("/api/v1/admin/stats"), Response(), refresh=False, credentials=None, db=db)
+    assert cached["computed_at"] == snapshot["computed_at"]
+    
+    with pytest.raises(HTTPException) as error:
+        await get_admin_stats(make_request("/api/v1/admin/stats"), Response(), refresh=True, credentials=None, db=db)
+    assert error.value.status_code == 401
@@ -50,3 +50,36 @@ async def test_invalid_token(client):
     )
     
     assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+async def test_user_cache_invalidated_across_workers(db, monkeypatch):
+    from bson import ObjectId
+    from app.core import user_cache
+    from app.core.cache import MemoryCache, TieredCache
+    
+    user_id = str(ObjectId())
+    await db.users.insert_one({"_id": user_id, "email": "cached@example.com", "credits": 10})
+    worker_a = TieredCache(MemoryCache(), None, l1_ttl=30)
+    worker_b = TieredCache(MemoryCache(), None, l1_ttl=30)
+    
+    # Both workers are polling and cache the user
+    for worker in (worker_a, worker_b):
+        monkeypatch.setattr(user_cache, "cache", worker)
+        await user_cache.sync_invalidations(db)
+        assert (await user_cache.get_user(db, user_id))["credits"] == 10
+    
+    # Worker A writes and invalidates
+    await db.users.update_one({"_id": user_id}, {"$set": {"credits": 3, "disabled": True}})
+    monkeypatch.setattr(user_cache, "cache", worker_a)
+    await user_cache.invalidate_user(db, user_id)
+    
+    # Worker B drops its L1 copy on its next poll instead of serving it for USER_CACHE_TTL
+    monkeypatch.setattr(user_cache, "cache", worker_b)
+    assert await user_cache.sync_invalidations(db) == 1
+    user = await user_cache.get_user(db, user_id)
+    assert user["credits"] == 3
+    assert user["disabled"] is True
+    
+    # A worker that stopped polling reads the database instead of its L1
+    await db.users.update_one({"_id": user_id}, {"$set": {"credits": 7}})
+    monkeypatch.setattr(user_cache, "_invalidations_synced_at", None)
+    assert (await user_cache.get_user(db, user_id))["credits"] == 7
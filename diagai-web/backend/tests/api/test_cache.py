@@ -0,0 +1,76 @@
+import time
+
+from app.core.cache import DiskCache, MemoryCache, TieredCache
+
+def disk_cache(tmp_path, max_bytes: int = 1024 * 1024) -> DiskCache:
+    return DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes)
+
+async def test_disk_cache_round_trip(tmp_path):
+    l2 = disk_cache(tmp_path)
+    await l2.set("render:png", b"\x89PNG", expire=60)
+    await l2.set("render:meta", {"width": 800, "tags": ["a", "b"]})
+
+    assert await l2.get("render:png") == b"\x89PNG"
+    assert await l2.get("render:meta") == {"width": 800, "tags": ["a", "b"]}
+    await l2.close()
+
+async def test_disk_cache_ttl_expiry(tmp_path, monkeypatch):
+    l2 = disk_cache(tmp_path)
+    await l2.set("short", b"value", expire=10)
+    await l2.set("forever", b"value")
+
+    later = time.time() + 11
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert await l2.get("short") is None
+    assert await l2.get("forever") == b"value"
+    await l2.close()
+
+async def test_disk_cache_evicts_least_recently_used(tmp_path):
+    payload = b"x" * 1000
+    l2 = disk_cache(tmp_path, max_bytes=2500)
+    await l2.set("a", payload)
+    await l2.set("b", payload)
+    # Reading "a" makes "b" the least recently used
+    assert await l2.get("a") == payload
+    await l2.set("c", payload)
+
+    assert await l2.get("b") is None
+    assert await l2.get("a") == payload
+    assert await l2.get("c") == payload
+    await l2.close()
+
+async def test_disk_cache_drops_unreadable_entries(tmp_path):
+    l2 = disk_cache(tmp_path)
+    await l2.set("old", b"value")
+    conn = l2._connect()
+    conn.execute("UPDATE cache SET value = ? WHERE key = ?", (b"\x80\x04not bson", "diagai:old"))
+    conn.commit()
+
+    assert await l2.get("old") is None
+    assert conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] == 0
+    await l2.close()
+
+async def test_tiered_cache_promotes_l2_hits(tmp_path):
+    l2 = disk_cache(tmp_path)
+    await l2.set("render", b"image", expire=600)
+    tiered = TieredCache(MemoryCache(), l2, l1_ttl=30)
+
+    # Another worker wrote it: L1 miss, L2 hit, then served from L1
+    assert await tiered.l1.get("render") is None
+    assert await tiered.get("render") == b"image"
+    assert await tiered.l1.get("render") == b"image"
+
+    # L1 copies never outlive the L1 TTL
+    entry = tiered.l1.cache[tiered.l1._get_key("render")]
+    assert entry["expires_at"] is not None
+
+    await tiered.delete("render")
+    assert await tiered.get("render") is None
+    await tiered.close()
+
+async def test_tiered_cache_without_l2():
+    tiered = TieredCache(MemoryCache(), None, l1_ttl=30)
+    await tiered.set("key", {"n": 1}, expire=60)
+
+    assert await tiered.get("key") == {"n": 1}
+    assert await tiered.get("missing") is None
@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+
+from app.api.v1.diagrams import generate_diagram
+from app.services import diagram_state
+from app.models.diagram import DiagramCreate
+
+async def test_concurrent_generation_never_overspends(db, test_user, make_request):
+    """Concurrent requests may only reserve the credits the user actually has."""
+    attempts = 25
+    credits = test_user["credits"]
+    diagram = DiagramCreate(prompt="A login flow", type="image", project_id="p", generation_type="flowchart")
+
+    results = await asyncio.gather(*(
+        generate_diagram(
+            diagram=diagram,
+            background_tasks=BackgroundTasks(),
+            request=make_request("/api/v1/diagrams/generate", "POST"),
+            current_user=test_user,
+            db=db
+        )
+        for _ in range(attempts)
+    ), return_exceptions=True)
+
+    succeeded = [result for result in results if isinstance(result, dict)]
+    rejected = [result for result in results if isinstance(result, HTTPException)]
+    assert len(succeeded) == credits
+    assert len(rejected) == attempts - credits
+    assert all(error.status_code == 400 for error in rejected)
+
+    user = await db.users.find_one({"_id": test_user["_id"]})
+    assert user["credits"] == 0
+    assert user["stats"]["total_diagrams"] == credits
+    assert user["stats"]["credits_consumed"] == credits
+    assert await db.diagrams.count_documents({"user_id": test_user["_id"]}) == credits
+
+async def test_generation_rejects_insufficient_credits(db, test_user, make_request):
+    await db.users.update_one({"_id": test_user["_id"]}, {"$set": {"credits": 2}})
+    diagram = DiagramCreate(prompt="A deploy pipeline", type="gif", project_id="p", generation_type="flowchart")
+
+    with pytest.raises(HTTPException) as error:
+        await generate_diagram(
+            diagram=diagram,
+            background_tasks=BackgroundTasks(),
+            request=make_request("/api/v1/diagrams/generate", "POST"),
+            current_user=test_user,
+            db=db
+        )
+
+    assert error.value.status_code == 400
+    user = await db.users.find_one({"_id": test_user["_id"]})
+    assert user["credits"] == 2
+    assert await db.diagrams.count_documents({"user_id": test_user["_id"]}) == 0
+
+async def test_failed_generation_refunds_once(db, test_user, query_counter, make_request):
+    diagram = await generate_diagram(
+        diagram=DiagramCreate(prompt="A queue", type="gif", project_id="p", generation_type="flowchart"),
+        background_tasks=BackgroundTasks(),
+        request=make_request("/api/v1/diagrams/generate", "POST"),
+        current_user=test_user,
+        db=db
+    )
+    query_counter.reset()
+
+    assert await diagram_state.transition(db, dict(diagram), "failed", error="boom")
+    # compare-and-set: the diagram is no longer processing, so nothing happens
+    assert not await diagram_state.transition(db, dict(diagram), "completed", url="x")
+    # status CAS + user refund/counters + usage rollup, then the rejected CAS alone
+    assert query_counter.commands.count("update") == 4
+
+    user = await db.users.find_one({"_id": test_user["_id"]})
+    assert user["credits"] == test_user["credits"]
+    assert user["stats"]["failed_diagrams"] == 1
+    assert user["stats"].get("completed_diagrams", 0) == 0
+    stored = await db.diagrams.find_one({"_id": diagram["_id"]})
+    assert stored["status"] == "failed"
+
+async def test_generate_query_budget(db, test_user, max_queries, make_request):
+    # credit reservation + diagram insert + usage rollup
+    with max_queries(3):
+        await generate_diagram(
+            diagram=DiagramCreate(prompt="A state machine", type="image", project_id="p", generation_type="flowchart"),
+            background_tasks=BackgroundTasks(),
+            request=make_request("/api/v1/diagrams/generate", "POST"),
+            current_user=test_user,
+            db=db
+        )
@@ -0,0 +1,20 @@
+from app.middleware.logging import request_details
+
+def test_request_details_redacts_credentials():
+    scope = {
+        "method": "GET",
+        "query_string": b"search=jane%40example.com&token=secret&page=2&limit=10",
+        "client": ("127.0.0.1", 50000),
+        "headers": [
+            (b"authorization", b"Bearer secret"),
+            (b"cookie", b"session=secret"),
+            (b"user-agent", b"pytest"),
+            (b"x-custom", b"value")
+        ]
+    }
+    
+    details = request_details(scope, "/api/v1/admin/users")
+    
+    assert details["query"] == {"search": "[REDACTED]", "token": "[REDACTED]", "page": "2", "limit": "10"}
+    assert details["headers"] == {"authorization": "[REDACTED]", "cookie": "[REDACTED]", "user-agent": "pytest"}
+    assert "secret" not in str(details) and "jane" not in str(details)
@@ -0,0 +1,75 @@
+from bson import ObjectId
+
+from app.core import metrics
+from app.core.metrics import OTHER_ROUTE, REGISTRY, UNMATCHED_ROUTE, route_template
+from app.services import usage
+from app.services.admin_stats import admin_stats, publish_metrics
+from main import app
+
+def http_scope(path: str, method: str = "GET") -> dict:
+    return {"type": "http", "method": method, "path": path, "root_path": "", "app": app}
+
+def request_series() -> set:
+    return {
+        (sample.labels["method"], sample.labels["route"], sample.labels["status"])
+        for family in REGISTRY.collect() if family.name == "http_requests"
+        for sample in family.samples if sample.name == "http_requests_total"
+    }
+
+def test_route_template_labels():
+    diagram_id = str(ObjectId())
+    assert route_template(http_scope(f"/api/v1/diagrams/{diagram_id}")) == "/api/v1/diagrams/{diagram_id}"
+    assert route_template(http_scope(f"/storage/diagrams/{diagram_id}.png")) == "/storage/{path}"
+    assert route_template(http_scope("/wp-login.php")) == UNMATCHED_ROUTE
+
+def test_route_labels_capped(monkeypatch):
+    monkeypatch.setattr(metrics, "_labelled_routes", set())
+    monkeypatch.setattr(metrics.settings, "METRICS_MAX_ROUTES", 1)
+    assert route_template(http_scope("/api/v1/health/")) == "/api/v1/health/"
+    assert route_template(http_scope("/api/v1/projects/")) == OTHER_ROUTE
+    assert route_template(http_scope("/api/v1/health/")) == "/api/v1/health/"
+
+def test_request_series_bounded(client):
+    client.get("/api/v1/health/")
+    before = request_series()
+    for _ in range(20):
+        client.get(f"/api/v1/diagrams/{ObjectId()}")
+        client.get(f"/storage/diagrams/{ObjectId()}.png")
+        client.get(f"/no-such-page/{ObjectId()}")
+    added = request_series() - before
+    assert len(added) <= 3
+    assert {route for _, route, _ in added} <= {"/api/v1/diagrams/{diagram_id}", "/storage/{path}", UNMATCHED_ROUTE}
+
+async def test_credit_balance_gauges(db):
+    await db.users.insert_one({"_id": str(ObjectId()), "email": "overdrawn@example.com", "credits": -5})
+    snapshot = await admin_stats.compute(db)
+    assert snapshot["credits"]["by_balance"]["10-24"] == 1
+    assert snapshot["credits"]["by_balance"]["1000+"] == 1
+    assert snapshot["credits"]["by_balance"]["<0"] == 1
+    assert snapshot["credits"]["by_balance"]["0"] == 0
+
+    publish_metrics(snapshot)
+    assert REGISTRY.get_sample_value("users_by_credit_balance", {"range": "1000+"}) == 1
+    assert REGISTRY.get_sample_value("users_by_credit_balance", {"range": "<0"}) == 1
+    assert REGISTRY.get_sample_value("user_credits_outstanding") == 1005
+
+async def test_usage_backfill_replaces_rollup(db):
+    user_id = str(ObjectId())
+    created_at = datetime.utcnow()
+    await db.diagrams.insert_many([
+        {"_id": str(ObjectId()), "user_id": user_id, "type": "image", "status": "completed", "created_at": created_at}
+        for _ in range(3)
+    ])
+    # A drifted bucket and one for diagrams that no longer exist
+    await db.usage_daily.insert_many([
+        {"user_id": user_id, "day": usage.day_of(created_at), "type": "image", "status": "completed", "count": 1},
+        {"user_id": user_id, "day": usage.day_of(created_at), "type": "gif", "status": "failed", "count": 4}
+    ])
+    
+    await usage.backfill(db)
+    
+    assert await usage.daily_counts(db, user_id, created_at) == {usage.day_of(created_at): 3}
+    # Upserts still rely on the unique bucket index after the swap
+    indexes = await db.usage_daily.index_information()
+    assert any(info.get("unique") for info in indexes.values())
+    assert usage.REBUILD_COLLECTION not in await db.list_collection_names()
@@ -1,8 +1,15 @@
+import json
 import pytest
+from datetime import datetime, timedelta
 from httpx import AsyncClient
-from fastapi import status
+from fastapi import Response, status
 from bson import ObjectId
 
+from app.api.v1.projects import create_project, get_project_diagrams, get_projects
+from app.api.v1.users import get_dashboard_stats
+from app.models.project import ProjectCreate
+from app.services import counters
+
 async def test_create_project(client, db, user_token):
     project_data = {
         "name": "Test Project",
@@ -121,3 +128,113 @@ async def test_delete_project(client, db, user_token, test_user):
     # Check database
     deleted_project = await db.projects.find_one({"_id": project_id})
     assert deleted_project is None
+
+async def test_project_diagrams_pages_and_stream(db, test_user):
+    project_id = str(ObjectId())
+    await db.projects.insert_one({"_id": project_id, "user_id": test_user["_id"], "name": "Big"})
+    now = datetime.utcnow()
+    await db.diagrams.insert_many([
+        {
+            "_id": str(ObjectId()),
+            "user_id": test_user["_id"],
+            "project_id": project_id,
+            "prompt": f"Diagram {i}",
+            "status": "completed",
+            "created_at": now - timedelta(minutes=i)
+        }
+        for i in range(5)
+    ])
+    params = dict(
+        project_id=project_id, limit=2, format="json", status=None, type=None,
+        view="full", fields=None, current_user=test_user, db=db
+    )
+    
+    # Cursor pages are bounded and walk the whole project
+    seen, cursor = [], None
+    while True:
+        response = Response()
+        page = await get_project_diagrams(response=response, cursor=cursor, **params)
+        assert len(page) <= 2
+        seen.extend(diagram["prompt"] for diagram in page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [f"Diagram {i}" for i in range(5)]
+    
+    # NDJSON streams every row
+    streamed = await get_project_diagrams(response=Response(), cursor=None, **{**params, "format": "ndjson"})
+    assert streamed.media_type == "application/x-ndjson"
+    lines = [json.loads(line) async for line in streamed.body_iterator]
+    assert [line["prompt"] for line in lines] == seen
+
+async def test_project_listing_not_modified(db, test_user, make_request):
+    user = {**test_user, "_id": str(ObjectId()), "stats": {"total_projects": 1}}
+    now = datetime.utcnow()
+    await db.projects.insert_one({
+        "_id": str(ObjectId()), "user_id": user["_id"], "name": "Polled", "diagrams": [],
+        "created_at": now, "updated_at": now
+    })
+    params = dict(limit=100, cursor=None, format="json", view="summary", fields=None, current_user=user, db=db)
+    
+    response = Response()
+    projects = await get_projects(make_request("/api/v1/projects/"), response, **params)
+    assert [project["name"] for project in projects] == ["Polled"]
+    etag = response.headers["ETag"]
+    
+    # Unchanged listing: 304 without a body
+    not_modified = await get_projects(make_request("/api/v1/projects/", headers={"If-None-Match": etag}), Response(), **params)
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    assert not_modified.headers["ETag"] == etag
+    
+    # Any project update changes the tag
+    await db.projects.update_one({"user_id": user["_id"]}, {"$set": {"name": "Renamed", "updated_at": now + timedelta(seconds=1)}})
+    response = Response()
+    projects = await get_projects(make_request("/api/v1/projects/", headers={"If-None-Match": etag}), response, **params)
+    assert [project["name"] for project in projects] == ["Renamed"]
+    assert response.headers["ETag"] != etag
+
+async def test_existing_user_counters_backfilled(db, test_user, make_request):
+    # Created before counters existed: diagrams but no `stats`
+    user_id = str(ObjectId())
+    await db.users.insert_one({**test_user, "_id": user_id, "email": "existing@example.com"})
+    await db.diagrams.insert_many([
+        {"_id": str(ObjectId()), "user_id": user_id, "status": "completed", "credits_used": 1},
+        {"_id": str(ObjectId()), "user_id": user_id, "status": "completed", "credits_used": 1}
+    ])
+    
+    user = await db.users.find_one({"_id": user_id})
+    await create_project(ProjectCreate(name="First", description=""), current_user=user, db=db)
+    
+    # The $inc left partial counters; the dashboard backfills them
+    user = await db.users.find_one({"_id": user_id})
+    assert "v" not in user["stats"]
+    dashboard = await get_dashboard_stats(make_request("/api/v1/users/dashboard"), Response(), current_user=user, db=db)
+    assert dashboard["stats"]["totalProjects"] == 1
+    assert dashboard["stats"]["totalDiagrams"] == 2
+    assert dashboard["stats"]["creditsUsed"] == 2
+    
+    user = await db.users.find_one({"_id": user_id})
+    assert user["stats"]["v"] == counters.STATS_VERSION
+
+async def test_project_listing_tag_changes_on_delete_with_stale_user(db, test_user, make_request):
+    # `user` stands in for a cached copy whose counters never see the delete
+    user = {**test_user, "_id": str(ObjectId()), "stats": None}
+    now = datetime.utcnow()
+    older, newer = str(ObjectId()), str(ObjectId())
+    await db.projects.insert_many([
+        {"_id": older, "user_id": user["_id"], "name": "Older", "diagrams": [], "created_at": now, "updated_at": now},
+        {"_id": newer, "user_id": user["_id"], "name": "Newer", "diagrams": [],
+         "created_at": now + timedelta(seconds=1), "updated_at": now + timedelta(seconds=1)}
+    ])
+    params = dict(limit=100, cursor=None, format="json", view="summary", fields=None, current_user=user, db=db)
+    
+    response = Response()
+    await get_projects(make_request("/api/v1/projects/"), response, **params)
+    etag = response.headers["ETag"]
+    
+    # Deleting a project that is not the newest leaves the max updated_at as is
+    await db.projects.delete_one({"_id": older})
+    response = Response()
+    projects = await get_projects(make_request("/api/v1/projects/", headers={"If-None-Match": etag}), response, **params)
+    assert [project["name"] for project in projects] == ["Newer"]
+    assert response.headers["ETag"] != etag
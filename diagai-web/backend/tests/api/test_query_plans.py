@@ -0,0 +1,82 @@
+import pytest
+from datetime import datetime, timedelta
+
+from app.core.indexes import INDEXES
+from app.core.pagination import SORTABLE_FIELDS
+
+NOW = datetime.utcnow()
+DESC = [("created_at", -1), ("_id", -1)]
+
+# (collection, filter, sort) for the queries the routers issue
+QUERY_SHAPES = [
+    # auth / users
+    ("users", {"email": "user@example.com"}, None),
+    ("users", {"firebase_uid": "uid"}, None),
+    ("users", {}, DESC),
+    ("users", {}, [("email", 1), ("_id", 1)]),
+    ("users", {}, [("credits", -1), ("_id", -1)]),
+    # user dashboards and usage
+    ("diagrams", {"user_id": "u"}, DESC),
+    ("diagrams", {"user_id": "u", "created_at": {"$gte": NOW - timedelta(days=30)}}, None),
+    ("diagrams", {"user_id": "u", "status": "completed"}, None),
+    ("diagrams", {"user_id": "u", "status": "completed",
+                  "created_at": {"$gte": NOW - timedelta(days=7), "$lt": NOW}}, None),
+    ("projects", {"user_id": "u"}, DESC),
+    ("usage_daily", {"user_id": "u", "day": {"$gte": NOW - timedelta(days=30)}}, None),
+    ("usage_daily", {"user_id": "u", "day": {"$gte": NOW - timedelta(days=180)}, "status": "completed"}, None),
+    # projects
+    ("diagrams", {"project_id": "p"}, [("created_at", -1)]),
+    ("diagrams", {"project_id": "p", "status": "completed"}, [("created_at", -1)]),
+    ("diagrams", {"project_id": "p"}, DESC),
+    ("diagrams", {"project_id": "p", "status": "completed"}, DESC),
+    ("projects", {"user_id": "u"}, [("created_at", 1), ("_id", 1)]),
+    ("projects", {"user_id": "u"}, [("updated_at", -1)]),
+    # admin listings
+    ("diagrams", {"created_at": {"$gte": NOW - timedelta(days=30)}}, None),
+    ("projects", {}, DESC),
+    ("projects", {}, [("updated_at", -1), ("_id", -1)]),
+    ("projects", {}, [("name", 1), ("_id", 1)]),
+    ("outputs", {"diagram_id": "d"}, [("created_at", -1)]),
+]
+
+# /admin/diagrams: every status/type filter with every sort it accepts
+ADMIN_DIAGRAM_FILTERS = [{}, {"status": "completed"}, {"type": "gif"}, {"status": "completed", "type": "gif"}]
+QUERY_SHAPES += [
+    ("diagrams", query, [(field, direction), ("_id", direction)])
+    for query in ADMIN_DIAGRAM_FILTERS
+    for field in SORTABLE_FIELDS["diagrams"]
+    for direction in (1, -1)
+]
+
+def plan_stages(plan) -> list:
+    """Every stage name in an explain() plan tree, classic or SBE."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+@pytest.mark.parametrize("collection,query,sort", QUERY_SHAPES)
+async def test_query_uses_index(db, collection, query, sort):
+    # explain() on a missing collection short-circuits to EOF; make sure it exists
+    await db[collection].insert_one({"created_at": NOW})
+
+    cursor = db[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explanation = await cursor.explain()
+    stages = plan_stages(explanation["queryPlanner"]["winningPlan"])
+
+    assert "COLLSCAN" not in stages, f"{collection} {query} {sort}: {stages}"
+    assert "SORT" not in stages, f"{collection} {query} {sort}: {stages}"
+
+def test_sortable_fields_are_indexed():
+    indexed = {(spec.collection, spec.keys) for spec in INDEXES}
+    for collection, fields in SORTABLE_FIELDS.items():
+        for field in fields:
+            assert (collection, ((field, 1), ("_id", 1))) in indexed, f"{collection}.{field}"
@@ -0,0 +1,35 @@
+# Compression ratio and CPU cost of JSON responses at the configured levels.
+#
+#     python tests/benchmarks/bench_compression.py
+#
+# Uses the same diagram/project pages as bench_serialization, encoded the way
+# ORJSONResponse sends them.
+import gzip
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from bench_serialization import PAGE, diagram, project
+from app.core.responses import dumps
+from app.middleware.compression import brotli
+
+def codecs():
+    for level in (1, 6, 9):
+        yield f"gzip -{level}", lambda body, level=level: gzip.compress(body, compresslevel=level, mtime=0)
+    if brotli is not None:
+        for quality in (1, 5, 11):
+            yield f"br q{quality}", lambda body, quality=quality: brotli.compress(body, quality=quality)
+
+def measure(label: str, page: list) -> None:
+    body = dumps(page)
+    print(f"{label:<16} {'identity':<10} {len(body):>8} B")
+    for name, encode in codecs():
+        compressed = encode(body)
+        seconds = min(timeit.repeat(lambda: encode(body), number=10, repeat=3)) / 10
+        print(f"{label:<16} {name:<10} {len(compressed):>8} B  {len(compressed) / len(body):>6.1%}  {seconds * 1e3:>7.2f} ms")
+
+if __name__ == "__main__":
+    measure("diagrams x100", [diagram(i) for i in range(PAGE)])
+    measure("projects x100", [project(i) for i in range(PAGE)])
@@ -0,0 +1,116 @@
+# Time the event loop spends logging one request, before and after the queue pipeline.
+#
+#     python tests/benchmarks/bench_logging.py
+#
+# "before" reproduces the old request log: every header json.dumps'd on the
+# caller and written through a FileHandler and a stdout StreamHandler. "after"
+# is the app.core.logger pipeline, where the caller only queues the record.
+# Output goes to a temp file and /dev/null; only the caller's time is counted.
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import tempfile
+import time
+from logging.handlers import QueueListener
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.logger import CustomJSONFormatter, NonBlockingHandler, loggable_headers
+
+REQUESTS = 20000
+
+RAW_HEADERS = [
+    (b"host", b"api.diagai.app"),
+    (b"connection", b"keep-alive"),
+    (b"authorization", b"Bearer eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9." + b"x" * 180),
+    (b"sec-ch-ua", b'"Chromium";v="118", "Google Chrome";v="118", "Not=A?Brand";v="99"'),
+    (b"accept", b"application/json, text/plain, */*"),
+    (b"sec-ch-ua-mobile", b"?0"),
+    (b"user-agent", b"Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 Chrome/118.0 Safari/537.36"),
+    (b"sec-ch-ua-platform", b'"macOS"'),
+    (b"origin", b"https://diagai.app"),
+    (b"sec-fetch-site", b"same-site"),
+    (b"sec-fetch-mode", b"cors"),
+    (b"referer", b"https://diagai.app/dashboard"),
+    (b"accept-encoding", b"gzip, deflate, br"),
+    (b"accept-language", b"en-US,en;q=0.9"),
+    (b"cookie", b"_ga=GA1.1.123456789.1697000000; session=" + b"y" * 64)
+]
+
+def isolated_logger(name: str, *handlers: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers = list(handlers)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+def before(log_file: str, devnull) -> float:
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler(devnull)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    logger = isolated_logger("bench.before", *handlers)
+
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        logger.info(json.dumps({
+            "method": "GET",
+            "url": "http://api.diagai.app/api/v1/users/dashboard",
+            "client_ip": "127.0.0.1",
+            "headers": {name.decode("latin-1"): value.decode("latin-1") for name, value in RAW_HEADERS},
+            "status_code": 200,
+            "processing_time": "0.0042s"
+        }))
+    elapsed = time.perf_counter() - start
+    for handler in handlers:
+        handler.close()
+    return elapsed
+
+def after(log_file: str, devnull, rate: float = 1.0) -> float:
+    formatter = CustomJSONFormatter()
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler(devnull)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    listener = QueueListener(queue.SimpleQueue(), *handlers)
+    logger = isolated_logger("bench.after", NonBlockingHandler(listener.queue))
+    listener.start()
+
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        if rate < 1 and random.random() >= rate:
+            continue
+        logger.info(
+            "GET /api/v1/users/dashboard 200 0.0042s",
+            extra={"extra_fields": {
+                "method": "GET",
+                "path": "/api/v1/users/dashboard",
+                "query": None,
+                "client_ip": "127.0.0.1",
+                "headers": loggable_headers(RAW_HEADERS),
+                "status_code": 200,
+                "processing_time": "0.0042s",
+                "sample_rate": rate
+            }}
+        )
+    elapsed = time.perf_counter() - start
+    listener.stop()
+    for handler in handlers:
+        handler.close()
+    return elapsed
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        results = {
+            "before": before(os.path.join(directory, "before.log"), devnull),
+            "after": after(os.path.join(directory, "after.log"), devnull),
+            "after, 10% sampled": after(os.path.join(directory, "after, 10% sampled.log"), devnull, rate=0.1)
+        }
+        sizes = {name: os.path.getsize(os.path.join(directory, f"{name}.log")) for name in results}
+    for name, seconds in results.items():
+        print(
+            f"{name:<20} {seconds / REQUESTS * 1e6:>7.1f} us/request on the loop  "
+            f"{sizes[name] / REQUESTS:>6.0f} B/request written"
+        )
@@ -0,0 +1,104 @@
+# Requests/sec on a trivial route through the logging + metrics middleware.
+#
+#     python tests/benchmarks/bench_middleware.py
+#
+# Compares the previous BaseHTTPMiddleware versions (reproduced below) with
+# the pure ASGI ones, calling the ASGI app directly so no client or server
+# overhead is included. Log records go to a NullHandler.
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.middleware.logging import LoggingMiddleware, logger
+from app.core.metrics import REQUEST_COUNT, REQUEST_LATENCY
+from app.middleware.metrics import MetricsMiddleware
+
+REQUESTS = 5000
+
+class BaseHTTPLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        start_time = time.time()
+        request_details = {
+            "method": request.method,
+            "url": str(request.url),
+            "client_ip": request.client.host if request.client else None,
+            "headers": dict(request.headers),
+        }
+        response = await call_next(request)
+        logger.info(json.dumps({
+            **request_details,
+            "status_code": response.status_code,
+            "processing_time": f"{time.time() - start_time:.4f}s"
+        }))
+        return response
+
+class BaseHTTPMetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        REQUEST_COUNT.labels(method=request.method, route=request.url.path, status=response.status_code).inc()
+        REQUEST_LATENCY.labels(method=request.method, route=request.url.path).observe(time.time() - start_time)
+        return response
+
+def build(*middleware) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    for cls in middleware:
+        app.add_middleware(cls)
+    return app
+
+async def requests_per_second(app: FastAPI) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"user-agent", b"bench"), (b"accept", b"*/*")],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 8000)
+    }
+
+    async def send(message):
+        pass
+
+    async def request():
+        received = False
+
+        async def receive():
+            # Like a server: the body once, then nothing until the client goes away
+            nonlocal received
+            if received:
+                await asyncio.Event().wait()
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        await app(dict(scope), receive, send)
+
+    for _ in range(200):
+        await request()
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await request()
+    return REQUESTS / (time.perf_counter() - start)
+
+async def main():
+    logger.handlers = [logging.NullHandler()]
+    logger.propagate = False
+    stacks = {
+        "no middleware": build(),
+        "BaseHTTPMiddleware": build(BaseHTTPLoggingMiddleware, BaseHTTPMetricsMiddleware),
+        "pure ASGI": build(LoggingMiddleware, MetricsMiddleware)
+    }
+    for name, app in stacks.items():
+        print(f"{name:<20} {await requests_per_second(app):>8.0f} req/s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+# Response size and BSON decode cost of list projections.
+#
+#     python tests/benchmarks/bench_projections.py
+#
+# Builds a page of diagram documents shaped like production ones and compares
+# the full documents with the "summary" view and a sparse fieldset.
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+import bson
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.projections import resolve_projection
+
+PAGE = 100
+
+def diagram(i: int) -> dict:
+    is_gif = i % 3 == 0
+    diagram_id = str(ObjectId())
+    return {
+        "_id": diagram_id,
+        "user_id": str(ObjectId()),
+        "project_id": str(ObjectId()),
+        "prompt": ("Draw the checkout flow with payment retries, fraud checks and the email "
+                   "confirmation, grouping services by team and marking async hops. ") * 3,
+        "type": "gif" if is_gif else "image",
+        "diagramType": "flowchart",
+        "url": f"http://localhost:8000/storage/diagrams/{diagram_id}.png",
+        "frames": [f"http://localhost:8000/storage/frames/{diagram_id}_{n}.png" for n in range(24)] if is_gif else [],
+        "credits_used": 3 if is_gif else 1,
+        "status": "failed" if i % 10 == 0 else "completed",
+        "error": "Mermaid render failed: Parse error on line 12: ...--> B{Fraud?}" * 4 if i % 10 == 0 else None,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+
+def project(document: dict, projection) -> dict:
+    if projection is None:
+        return document
+    return {key: value for key, value in document.items() if key == "_id" or key in projection}
+
+def measure(label: str, documents: list, projection) -> None:
+    page = [project(document, projection) for document in documents]
+    raw = [bson.encode(document) for document in page]
+    body = json.dumps(jsonable_encoder(page)).encode()
+    decode = min(timeit.repeat(lambda: [bson.decode(item) for item in raw], number=50, repeat=5)) / 50
+    print(
+        f"{label:<28} {len(body) / PAGE:>8.0f} B/item json  "
+        f"{sum(map(len, raw)) / PAGE:>8.0f} B/item bson  "
+        f"{decode * 1e6:>8.0f} us/page decode"
+    )
+
+if __name__ == "__main__":
+    documents = [diagram(i) for i in range(PAGE)]
+    measure("full", documents, resolve_projection("diagrams", "full"))
+    measure("summary", documents, resolve_projection("diagrams", "summary"))
+    measure("fields=_id,status,url", documents, resolve_projection("diagrams", fields="_id,status,url"))
@@ -0,0 +1,98 @@
+# Cost of encoding API responses: FastAPI's default path versus orjson.
+#
+#     python tests/benchmarks/bench_serialization.py
+#
+# Encodes pages of diagram and project documents shaped like production ones
+# the way each path does it, and checks every path decodes to the same JSON.
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from typing import List
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.responses import ORJSONResponse
+
+PAGE = 100
+
+def diagram(i: int) -> dict:
+    is_gif = i % 3 == 0
+    diagram_id = ObjectId()
+    created_at = datetime.utcnow() - timedelta(minutes=i)
+    return {
+        "_id": diagram_id,
+        "user_id": str(ObjectId()),
+        "project_id": str(ObjectId()),
+        "prompt": "Draw the checkout flow with payment retries, fraud checks and the email confirmation",
+        "type": "gif" if is_gif else "image",
+        "diagramType": "flowchart",
+        "url": f"http://localhost:8000/storage/diagrams/{diagram_id}.png",
+        "frames": [f"http://localhost:8000/storage/frames/{diagram_id}_{n}.png" for n in range(24)] if is_gif else [],
+        "credits_used": 3 if is_gif else 1,
+        "status": "failed" if i % 10 == 0 else "completed",
+        "error": "Mermaid render failed" if i % 10 == 0 else None,
+        "created_at": created_at,
+        "updated_at": created_at + timedelta(seconds=7)
+    }
+
+def project(i: int) -> dict:
+    created_at = datetime.utcnow() - timedelta(days=i)
+    return {
+        "_id": ObjectId(),
+        "user_id": str(ObjectId()),
+        "name": f"Payments platform {i}",
+        "description": "Architecture and sequence diagrams for the payments team",
+        "status": "active",
+        "shared": i % 4 == 0,
+        "starred": i % 7 == 0,
+        "diagrams": [diagram(i * 10 + n) for n in range(5)],
+        "created_at": created_at,
+        "updated_at": created_at + timedelta(hours=1)
+    }
+
+def with_str_ids(value):
+    """Without orjson, routes must stringify ObjectIds themselves before returning"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: with_str_ids(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [with_str_ids(item) for item in value]
+    return value
+
+documents_adapter = TypeAdapter(List[dict])
+
+def jsonable(page: list) -> bytes:
+    return JSONResponse(jsonable_encoder(page)).body
+
+def response_model(page: list) -> bytes:
+    return JSONResponse(documents_adapter.dump_python(documents_adapter.validate_python(page), mode="json")).body
+
+def orjson_route(page: list) -> bytes:
+    return ORJSONResponse(page).body
+
+def timed(encode, page: list) -> float:
+    return min(timeit.repeat(lambda: encode(page), number=20, repeat=5)) / 20
+
+def measure(label: str, page: list) -> None:
+    stringified = with_str_ids(page)
+    results = {
+        "jsonable_encoder": (jsonable(stringified), timed(jsonable, stringified)),
+        "response_model=dict": (response_model(stringified), timed(response_model, stringified)),
+        "orjson": (orjson_route(page), timed(orjson_route, page))
+    }
+    expected = json.loads(results["jsonable_encoder"][0])
+    baseline = results["jsonable_encoder"][1]
+    for name, (body, seconds) in results.items():
+        assert json.loads(body) == expected, f"{name} output differs for {label}"
+        print(f"{label:<16} {name:<20} {seconds * 1e3:>8.2f} ms/page  {baseline / seconds:>5.1f}x  {len(body):>8} B")
+
+if __name__ == "__main__":
+    measure("diagrams x100", [diagram(i) for i in range(PAGE)])
+    measure("projects x100", [project(i) for i in range(PAGE)])
@@ -1,13 +1,17 @@
 import pytest
 from fastapi.testclient import TestClient
 from motor.motor_asyncio import AsyncIOMotorClient
-import asyncio
 from datetime import datetime
 import os
-from typing import Generator, Dict
+from typing import Generator, Dict, Optional
+from contextlib import contextmanager
 import jwt
+from pymongo import monitoring
+from starlette.requests import Request
 
 from app.core.config import get_settings
+from app.core.db_monitoring import RequestDBStats, command_listener, request_db_stats
+from app.core.indexes import sync_indexes
 from main import app
 
 settings = get_settings()
@@ -15,27 +19,41 @@ settings = get_settings()
 # Test database
 TEST_MONGODB_URL = "mongodb://localhost:27017/diagai_test"
 
-@pytest.fixture(scope="session")
-def event_loop():
-    """Create an instance of the default event loop for the test session."""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
+class CommandCounter(monitoring.CommandListener):
+    """Counts database commands issued through the test client."""
+
+    def __init__(self):
+        self.commands = []
+
+    @property
+    def count(self) -> int:
+        return len(self.commands)
+
+    def reset(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+command_counter = CommandCounter()
 
 @pytest.fixture(scope="session")
 async def db():
     """Create a test database."""
-    client = AsyncIOMotorClient(TEST_MONGODB_URL)
+    client = AsyncIOMotorClient(TEST_MONGODB_URL, event_listeners=[command_counter, command_listener])
     db = client.diagai_test
     
     # Clear database before tests
     await db.command("dropDatabase")
     
     # Create indexes
-    await db.users.create_index("email", unique=True)
-    await db.users.create_index("firebase_uid", unique=True)
-    await db.projects.create_index([("user_id", 1), ("name", 1)])
-    await db.diagrams.create_index([("user_id", 1), ("project_id", 1)])
+    await sync_indexes(db)
     
     yield db
     
@@ -43,6 +61,41 @@ async def db():
     await db.command("dropDatabase")
     client.close()
 
+@pytest.fixture
+def query_counter() -> CommandCounter:
+    """Count the database commands a test issues after this point."""
+    command_counter.reset()
+    return command_counter
+
+@pytest.fixture
+def max_queries():
+    """Assert that a block issues at most `limit` database commands.
+
+        with max_queries(3):
+            await generate_diagram(...)
+    """
+    @contextmanager
+    def check(limit: int):
+        stats = RequestDBStats()
+        token = request_db_stats.set(stats)
+        try:
+            yield stats
+        finally:
+            request_db_stats.reset(token)
+        assert stats.commands <= limit, f"{stats.commands} database commands, budget is {limit}"
+    return check
+
+@pytest.fixture
+def make_request():
+    """Build the Request a route function receives, for tests that call routes directly.
+
+        request = make_request("/api/v1/projects/", headers={"If-None-Match": etag})
+    """
+    def build(path: str, method: str = "GET", headers: Optional[Dict[str, str]] = None) -> Request:
+        raw_headers = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+        return Request({"type": "http", "method": method, "path": path, "query_string": b"", "headers": raw_headers})
+    return build
+
 @pytest.fixture(scope="session")
 def client() -> Generator:
     """Create a test client."""
@@ -84,7 +84,8 @@ export const adminApi = {
           status,
           type,
           sort_by,
-          sort_order
+          sort_order,
+          view: 'summary'
         }
       });
       return response;
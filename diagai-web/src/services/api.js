@@ -52,7 +52,7 @@ export const api = {
 
 export const userApi = {
   getDashboardStats: () => fetchWithAuth('/users/dashboard'),
-  getUserDiagrams: (limit = 10) => fetchWithAuth(`/users/diagrams?limit=${limit}`),
+  getUserDiagrams: (limit = 10) => fetchWithAuth(`/users/diagrams?limit=${limit}&view=summary`),
   getCredits: () => fetchWithAuth('/users/credits'),
   getCreditsUsage: () => fetchWithAuth('/users/credits/usage'),
   updateUser: (data) => fetchWithAuth('/users/me', {